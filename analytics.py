@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from database import db, Order, DailySales, ProductSales, CategorySales, upsert_increment
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+# ---------------- INCREMENTAL MAINTENANCE ----------------
+def _order_deltas(order):
+    """Rollup increments contributed by one order, keyed like the rollup tables."""
+    day = {"day": order.created_at.date(), "orders": 1, "items": order.item_count, "revenue": order.total}
+
+    products = {}
+    categories = {}
+    for line in order.lines:
+        product = products.setdefault(line.product_name, {
+            "product_name": line.product_name, "category": line.category,
+            "orders": 1, "quantity": 0, "revenue": 0.0,
+        })
+        product["quantity"] += line.quantity
+        product["revenue"] += line.line_total
+        if line.category:
+            category = categories.setdefault(line.category, {
+                "category": line.category, "orders": 1, "quantity": 0, "revenue": 0.0,
+            })
+            category["quantity"] += line.quantity
+            category["revenue"] += line.line_total
+    return day, list(products.values()), list(categories.values())
+
+
+def record_order(order):
+    """Add a freshly verified order to the rollups.
+
+    Called inside the transaction that creates the order, so the rollups
+    and the order history commit (or roll back) together.
+    """
+    if order.created_at is None:
+        order.created_at = utcnow()
+    day, products, categories = _order_deltas(order)
+    upsert_increment(DailySales, [day], ["day"], ["orders", "items", "revenue"])
+    if products:
+        upsert_increment(ProductSales, products, ["product_name"], ["orders", "quantity", "revenue"])
+    if categories:
+        upsert_increment(CategorySales, categories, ["category"], ["orders", "quantity", "revenue"])
+
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute every rollup from the order history in one streaming pass."""
+    days = defaultdict(lambda: {"orders": 0, "items": 0, "revenue": 0.0})
+    products = {}
+    categories = {}
+
+    query = Order.query.options(db.selectinload(Order.lines)).order_by(Order.id)
+    orders = 0
+    for order in query.yield_per(batch_size):
+        if order.created_at is None:
+            continue
+        day, order_products, order_categories = _order_deltas(order)
+        totals = days[day["day"]]
+        for key in ("orders", "items", "revenue"):
+            totals[key] += day[key]
+        for row in order_products:
+            merged = products.setdefault(row["product_name"], dict(row, orders=0, quantity=0, revenue=0.0))
+            for key in ("orders", "quantity", "revenue"):
+                merged[key] += row[key]
+        for row in order_categories:
+            merged = categories.setdefault(row["category"], dict(row, orders=0, quantity=0, revenue=0.0))
+            for key in ("orders", "quantity", "revenue"):
+                merged[key] += row[key]
+        orders += 1
+
+    db.session.query(DailySales).delete()
+    db.session.query(ProductSales).delete()
+    db.session.query(CategorySales).delete()
+    if days:
+        db.session.execute(db.insert(DailySales), [dict(v, day=k) for k, v in days.items()])
+    if products:
+        db.session.execute(db.insert(ProductSales), list(products.values()))
+    if categories:
+        db.session.execute(db.insert(CategorySales), list(categories.values()))
+    db.session.commit()
+    return orders
+
+
+# ---------------- READS ----------------
+# Each read touches at most one rollup row per day/product/category, never
+# the orders themselves.
+def revenue_series(period="day", days=30):
+    since = utcnow().date() - timedelta(days=days - 1)
+    rows = DailySales.query.filter(DailySales.day >= since).order_by(DailySales.day).all()
+    if period == "day":
+        return [
+            {"period": r.day.isoformat(), "orders": r.orders, "items": r.items, "revenue": round(r.revenue, 2)}
+            for r in rows
+        ]
+
+    weeks = {}
+    for r in rows:
+        week = weeks.setdefault(week_start(r.day), {"orders": 0, "items": 0, "revenue": 0.0})
+        week["orders"] += r.orders
+        week["items"] += r.items
+        week["revenue"] += r.revenue
+    return [
+        {"period": start.isoformat(), "orders": w["orders"], "items": w["items"], "revenue": round(w["revenue"], 2)}
+        for start, w in sorted(weeks.items())
+    ]
+
+
+def top_products(limit=10):
+    rows = ProductSales.query.order_by(ProductSales.revenue.desc()).limit(limit).all()
+    return [
+        {
+            "product_name": r.product_name,
+            "category": r.category,
+            "orders": r.orders,
+            "quantity": r.quantity,
+            "revenue": round(r.revenue, 2),
+        }
+        for r in rows
+    ]
+
+
+def category_breakdown():
+    rows = CategorySales.query.order_by(CategorySales.revenue.desc()).all()
+    return [
+        {"category": r.category, "orders": r.orders, "quantity": r.quantity, "revenue": round(r.revenue, 2)}
+        for r in rows
+    ]
+
+
+def summary():
+    orders, items, revenue = db.session.query(
+        db.func.coalesce(db.func.sum(DailySales.orders), 0),
+        db.func.coalesce(db.func.sum(DailySales.items), 0),
+        db.func.coalesce(db.func.sum(DailySales.revenue), 0.0),
+    ).one()
+    return {
+        "orders": orders,
+        "items": items,
+        "revenue": round(revenue, 2),
+        "average_basket": round(revenue / orders, 2) if orders else 0.0,
+        "average_items": round(items / orders, 2) if orders else 0.0,
+    }
@@ -0,0 +1,154 @@
+"""Fingerprinted, precompressed static assets.
+
+`flask --app app build-assets` copies every file under the static folder
+(and any ASSET_EXTRA_DIRS) into ASSET_BUILD_DIR with a content hash in its
+name and writes .gz (and .br, when the brotli package is installed) next to
+each text asset. A manifest maps logical paths to built files.
+
+Templates call `asset_url('style.css')`. With a manifest that gives
+/assets/style.3f9c0a1b2d.css, served with the best encoding the client
+accepts and a one-year immutable Cache-Control. Without one it falls back to
+the plain static URL, so a checkout without a build still works. A front
+proxy can serve ASSET_BUILD_DIR directly (nginx gzip_static / brotli_static).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class Assets:
+    def __init__(self, build_dir=None, extra_dirs=None):
+        self.build_dir = build_dir
+        self.extra_dirs = extra_dirs or {}
+        self.manifest = {}
+        self._manifest_mtime = None
+
+    def init_app(self, app):
+        self.app = app
+        self.build_dir = app.config.get("ASSET_BUILD_DIR") or os.path.join(app.static_folder, "dist")
+        self.extra_dirs = app.config.get("ASSET_EXTRA_DIRS", self.extra_dirs)
+        app.add_url_rule("/assets/<path:filename>", "assets", self.serve)
+        app.jinja_env.globals.update(asset_url=self.url)
+        app.extensions["assets"] = self
+
+    # ---------------- MANIFEST ----------------
+    @property
+    def manifest_path(self):
+        return os.path.join(self.build_dir, "manifest.json")
+
+    def _load(self):
+        # Re-read when a build lands while the app is running
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            self.manifest, self._manifest_mtime = {}, None
+            return self.manifest
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self.manifest
+
+    def url(self, path):
+        entry = self._load().get(path)
+        if entry is None:
+            return url_for("static", filename=path)
+        return url_for("assets", filename=entry["file"])
+
+    # ---------------- SERVING ----------------
+    def serve(self, filename):
+        if filename == "manifest.json":
+            raise NotFound()
+        accepted = request.accept_encodings
+        path = os.path.join(self.build_dir, filename)
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accepted[encoding] and os.path.isfile(path + suffix):
+                response = send_from_directory(self.build_dir, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(self.build_dir, filename)
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.vary.add("Accept-Encoding")
+        return response
+
+    # ---------------- BUILD ----------------
+    def sources(self):
+        """(logical path, absolute path) of every source file."""
+        roots = [("", self.app.static_folder)] + sorted(self.extra_dirs.items())
+        build_dir = os.path.abspath(self.build_dir)
+        for prefix, root in roots:
+            for directory, subdirs, files in os.walk(root):
+                subdirs[:] = [d for d in subdirs if os.path.abspath(os.path.join(directory, d)) != build_dir]
+                for name in sorted(files):
+                    source = os.path.join(directory, name)
+                    logical = os.path.relpath(source, root).replace(os.sep, "/")
+                    yield (f"{prefix}/{logical}" if prefix else logical), source
+
+    def build(self, clean=False, log=None):
+        """Build every asset and write the manifest. Returns file and byte totals."""
+        log = log or (lambda message: None)
+        if clean and os.path.isdir(self.build_dir):
+            shutil.rmtree(self.build_dir)
+        os.makedirs(self.build_dir, exist_ok=True)
+
+        manifest = {}
+        totals = {"files": 0, "bytes": 0, "gzip": 0, "brotli": 0}
+        for logical, source in self.sources():
+            with open(source, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(logical)
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            built = f"{stem}.{digest}{ext}"
+            entry = {"file": built, "size": len(data)}
+
+            target = os.path.join(self.build_dir, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write(target, data)
+            totals["files"] += 1
+            totals["bytes"] += len(data)
+
+            if ext.lower() in COMPRESSIBLE:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                _write(target + ".gz", compressed)
+                entry["gzip"] = len(compressed)
+                totals["gzip"] += len(compressed)
+                if brotli is not None:
+                    compressed = brotli.compress(data, quality=11)
+                    _write(target + ".br", compressed)
+                    entry["brotli"] = len(compressed)
+                    totals["brotli"] += len(compressed)
+
+            manifest[logical] = entry
+
+        if brotli is None:
+            log("brotli is not installed; wrote gzip only.")
+
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+        self._manifest_mtime = None
+        return totals
+
+
+def _write(path, data):
+    # Built names are content-addressed, so an existing file is already right
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
@@ -0,0 +1,232 @@
+"""Benchmark checkouts competing for the same scarce stock.
+
+Builds a throwaway SQLite database with --products tracked products of
+--stock units each and --checkouts carts holding a random handful of
+them, then has --concurrency threads check those carts out at once through
+payments.start_payment (the pending payment plus its stock holds, in one
+transaction, the way pay() does it). Half the successful checkouts are
+then paid and the rest fail, and the final stock is checked against what
+was sold: nothing may be oversold or lost.
+
+`--mode naive` checks out the way code without reservations tends to:
+read the stock, check it in Python, write back the new level. It shows
+the lost updates (oversold stock) that allows under contention.
+
+    python benchmarks/inventory.py
+    python benchmarks/inventory.py --checkouts 2000 --concurrency 200 --stock 100 --json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summary(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def naive_checkout(user, cart_id, reference, ttl):
+    """payments.start_payment done wrong: read the stock, check it in Python, write it back."""
+    from database import db, Product, Payment, StockReservation
+    import analytics
+    import cart_service
+    import inventory
+
+    lines, total = cart_service.checkout_snapshot(cart_id)
+    stock = {product.id: product for product in Product.query.filter(
+        Product.id.in_([line["product_id"] for line in lines]))}
+    for line in lines:
+        if stock[line["product_id"]].stock < line["quantity"]:
+            raise inventory.OutOfStock(line["product_name"], stock[line["product_id"]].stock)
+    db.session.add(Payment(reference=reference, user_id=user.id, email=user.email, lines=lines, status="pending",
+                           amount_kobo=int(round(total * 100))))
+    db.session.flush()
+    for line in lines:
+        product = stock[line["product_id"]]
+        product.stock = product.stock - line["quantity"]
+        db.session.add(StockReservation(payment_reference=reference, product_id=product.id, quantity=line["quantity"],
+                                        status="held", expires_at=analytics.utcnow() + timedelta(seconds=ttl)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5, help="tracked products everyone competes for")
+    parser.add_argument("--stock", type=int, default=200, help="starting units of each product")
+    parser.add_argument("--checkouts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="checkout threads")
+    parser.add_argument("--max-lines", type=int, default=3, help="products per checkout (1..n)")
+    parser.add_argument("--max-quantity", type=int, default=3, help="units per line (1..n)")
+    parser.add_argument("--mode", choices=("atomic", "naive"), default="atomic")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="inventory-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "inventory.db")
+    os.environ["JOB_QUEUE_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["CATALOG_CACHE_GENERATION_DB"] = os.path.join(workdir, "catalog_generation.db")
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+
+    from app import app
+    from database import db, Product, Users, Cart, CartItem, StockReservation
+    import cart_service
+    import inventory
+    import payments
+
+    checkout = naive_checkout if args.mode == "naive" else payments.start_payment
+
+    rng = random.Random(args.seed)
+    carts = []
+    with app.app_context():
+        db.session.add_all([Product(category="Burger", name=f"Limited Burger {i}", price=10.0, image="",
+                                    stock=args.stock) for i in range(args.products)])
+        db.session.commit()
+        prices = cart_service.PriceIndex.load()
+        for n in range(args.checkouts):
+            shopper_account = Users(username=f"bench{n}", email=f"bench{n}@example.com", phone="0", password="x")
+            db.session.add(shopper_account)
+            db.session.flush()
+            cart = Cart(user_id=shopper_account.id)
+            db.session.add(cart)
+            db.session.flush()
+            for product_id in rng.sample(sorted(prices.by_id), rng.randint(1, min(args.max_lines, len(prices)))):
+                product_id, name, price = prices.resolve(product_id)
+                db.session.add(CartItem(cart_id=cart.id, product_id=product_id, product_name=name, price=price,
+                                        quantity=rng.randint(1, args.max_quantity)))
+            db.session.flush()
+            cart_service.refresh_totals(cart.id)
+            carts.append((SimpleNamespace(id=shopper_account.id, email=shopper_account.email), cart.id))
+        db.session.commit()
+
+    latencies, outcomes, errors = [], {"reserved": [], "refused": 0}, []
+    lock = threading.Lock()
+    queue = iter(enumerate(carts))
+    start = threading.Barrier(args.concurrency)
+
+    def shopper():
+        start.wait()
+        with app.app_context():
+            while True:
+                with lock:
+                    job = next(queue, None)
+                if job is None:
+                    return
+                n, (user, cart_id) = job
+                reference = f"bench-{n}"
+                started = time.perf_counter()
+                try:
+                    checkout(user, cart_id, reference, 900)
+                    db.session.commit()
+                    result = reference
+                except inventory.OutOfStock:
+                    db.session.rollback()
+                    result = None
+                except Exception as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if result:
+                        outcomes["reserved"].append(result)
+                    else:
+                        outcomes["refused"] += 1
+
+    threads = [threading.Thread(target=shopper) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    with app.app_context():
+        held = sum(quantity for (quantity,) in db.session.query(StockReservation.quantity))
+        stock_after_checkout = sum(stock for (stock,) in db.session.query(Product.stock))
+
+        # Settle: every other successful checkout is paid, the rest fail
+        settle_started = time.perf_counter()
+        for i, reference in enumerate(sorted(outcomes["reserved"])):
+            if i % 2 == 0:
+                inventory.commit(reference)
+            else:
+                inventory.release(reference)
+            db.session.commit()
+        settle = time.perf_counter() - settle_started
+
+        sold = sum(quantity for (quantity,) in db.session.query(StockReservation.quantity)
+                   .filter(StockReservation.status == "committed"))
+        final_stock = sum(stock for (stock,) in db.session.query(Product.stock))
+        negative = db.session.query(Product).filter(Product.stock < 0).count()
+
+    initial = args.products * args.stock
+    results = {
+        "mode": args.mode,
+        "products": args.products,
+        "stock_per_product": args.stock,
+        "checkouts": args.checkouts,
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "checkouts_per_s": round(len(latencies) / wall, 1) if wall else None,
+        "reserved": len(outcomes["reserved"]),
+        "refused_out_of_stock": outcomes["refused"],
+        "errors": len(errors),
+        "latency": summary(latencies),
+        "settle_s": round(settle, 3),
+        "units_held": held,
+        "units_sold": sold,
+        "stock_initial": initial,
+        "stock_after_checkout": stock_after_checkout,
+        "stock_final": final_stock,
+        "consistent": (held == initial - stock_after_checkout and final_stock == initial - sold
+                       and held <= initial and not negative),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{args.mode}: {args.checkouts} checkouts by {args.concurrency} threads over "
+              f"{args.products} products x {args.stock} units")
+        print(f"  {results['wall_s']}s wall, {results['checkouts_per_s']} checkouts/s; "
+              f"{results['reserved']} reserved, {results['refused_out_of_stock']} refused, {results['errors']} errors")
+        latency = results["latency"]
+        if latency["count"]:
+            print(f"  latency ms: mean {latency['mean_ms']}  p50 {latency['p50_ms']}  p95 {latency['p95_ms']}  "
+                  f"p99 {latency['p99_ms']}  max {latency['max_ms']}")
+        print(f"  units held {held} of {initial}; stock left after checkout {stock_after_checkout}")
+        print(f"  after settling: {sold} sold, stock {final_stock} (expected {initial - sold})")
+        print("  consistent" if results["consistent"] else "  INCONSISTENT: stock was oversold or lost")
+        if errors:
+            print(f"  first error: {errors[0]}")
+    return 0 if results["consistent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
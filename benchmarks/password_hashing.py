@@ -0,0 +1,88 @@
+"""Login throughput vs. password hashing cost.
+
+Runs concurrent password checks through passwords.PasswordHasher for each
+method and pool size and reports checks per second with latency
+percentiles. A check is the CPU-bound part of a login.
+
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --methods scrypt:16384:8:1 --workers 1 4 --logins 100 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import HashingBusy, PasswordHasher  # noqa: E402
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:1000000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(method, workers, logins, concurrency):
+    hasher = PasswordHasher(method, workers=workers, max_pending=concurrency)
+    stored = hasher.hash("correct horse battery staple")
+    hasher.verify(stored, "warm up")  # start every pool process before timing
+
+    def login(_):
+        started = time.perf_counter()
+        try:
+            hasher.verify(stored, "correct horse battery staple")
+        except HashingBusy:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        latencies = list(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    done = [latency for latency in latencies if latency is not None]
+    return {
+        "method": hasher.method,
+        "workers": workers,
+        "concurrency": concurrency,
+        "logins": len(done),
+        "rejected": len(latencies) - len(done),
+        "logins_per_second": round(len(done) / elapsed, 2),
+        "p50_ms": round(statistics.median(done) * 1000, 1),
+        "p95_ms": round(percentile(done, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(done, 0.99) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, os.cpu_count() or 2],
+                        help="process pool sizes to try (0 = hash on the calling thread)")
+    parser.add_argument("--logins", type=int, default=40, help="password checks per run")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous login requests")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for method in args.methods:
+        for workers in sorted(set(args.workers)):
+            result = run(method, workers, args.logins, args.concurrency)
+            results.append(result)
+            if not args.json:
+                print(f"{result['method']:<24} workers={workers:<3} {result['logins_per_second']:>8.2f} logins/s  "
+                      f"p50={result['p50_ms']:.0f}ms p95={result['p95_ms']:.0f}ms p99={result['p99_ms']:.0f}ms")
+    if args.json:
+        print(json.dumps(results, indent=2))
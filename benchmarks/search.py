@@ -0,0 +1,134 @@
+"""Benchmark product search against a large catalog.
+
+Builds a throwaway SQLite database with --products generated items, then
+times typeahead queries (1-3 word prefixes of real product names, the way
+they arrive while someone types) through search.search_products and
+through the /api/search endpoint. The LIKE fallback is timed on the same
+queries for comparison.
+
+    python benchmarks/search.py
+    python benchmarks/search.py --products 100000 --queries 2000 --json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADJECTIVES = ["Smoky", "Spicy", "Classic", "Double", "Crispy", "Loaded", "Garlic", "Honey", "Chipotle", "Truffle",
+              "Mighty", "Golden", "Zesty", "Sweet", "Tangy", "Fiery", "Rustic", "Grilled", "Creamy", "Wild"]
+FLAVOURS = ["Cheese", "Bacon", "Mushroom", "Avocado", "Pepperoni", "Chicken", "Veggie", "Barbecue", "Jalapeno",
+            "Pesto", "Mango", "Chocolate", "Caramel", "Lime", "Ranch", "Buffalo", "Teriyaki", "Hawaiian", "Salsa", "Berry"]
+NOUNS = {"Burger": ["Burger", "Smash", "Stack", "Slider"], "Pizza": ["Pizza", "Pie", "Flatbread", "Calzone"],
+         "Taco": ["Taco", "Burrito", "Quesadilla", "Nachos"], "Dessert": ["Sundae", "Brownie", "Cheesecake", "Shake"]}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summary(samples):
+    return {
+        "queries": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def catalog(count, rng):
+    categories = list(NOUNS)
+    for i in range(count):
+        category = categories[i % len(categories)]
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(FLAVOURS)} {rng.choice(NOUNS[category])} {i}"
+        yield {"category": category, "name": name, "price": round(rng.uniform(2, 25), 2),
+               "image": f"https://example.com/{category.lower()}/{i}.jpg"}
+
+
+def typeahead_queries(names, count, rng):
+    """What the search box sends while a name is typed: growing prefixes of its first words."""
+    queries = []
+    while len(queries) < count:
+        words = rng.choice(names).split()[:rng.randint(1, 3)]
+        words[-1] = words[-1][:rng.randint(1, len(words[-1]))]
+        queries.append(" ".join(words))
+    return queries
+
+
+def time_calls(func, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        func(query)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10, help="results per query")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-like", action="store_true", help="don't time the LIKE fallback")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="search-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "search.db")
+    os.environ["JOB_QUEUE_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["CATALOG_CACHE_GENERATION_DB"] = os.path.join(workdir, "catalog_generation.db")
+    os.environ["PASSWORD_HASH_WORKERS"] = "0"
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+
+    from app import app
+    from database import db, Product
+    import search
+
+    rng = random.Random(args.seed)
+    results = {"products": args.products, "limit": args.limit}
+    with app.app_context():
+        rows = list(catalog(args.products, rng))
+        started = time.perf_counter()
+        for start in range(0, len(rows), 5000):
+            db.session.execute(db.insert(Product.__table__), rows[start:start + 5000])
+        db.session.commit()
+        results["insert_s"] = round(time.perf_counter() - started, 2)  # includes FTS trigger upkeep
+
+        queries = typeahead_queries([row["name"] for row in rows], args.queries, rng)
+        for query in queries[:20]:
+            search.search_products(query, args.limit)  # warm the page cache
+
+        results["fts"] = summary(time_calls(lambda q: search.search_products(q, args.limit), queries))
+        if not args.skip_like:
+            like = lambda q: search._like_search(search.terms(q), args.limit, None)
+            results["like"] = summary(time_calls(like, queries))
+
+    client = app.test_client()
+    results["endpoint"] = summary(time_calls(
+        lambda q: client.get("/api/search", query_string={"q": q, "limit": args.limit}), queries
+    ))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.products} products inserted in {results['insert_s']}s; {args.queries} typeahead queries, limit {args.limit}")
+    print(f"{'':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for mode in ("fts", "like", "endpoint"):
+        if mode in results:
+            row = results[mode]
+            print(f"{mode:<10}{row['mean_ms']:>10.2f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                  f"{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
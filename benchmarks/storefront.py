@@ -0,0 +1,281 @@
+"""Load test for the storefront and checkout flows.
+
+Seeds a throwaway SQLite database, starts a local Paystack stub and runs
+virtual shoppers against the app in-process: register or log in, browse
+the menu, add to cart and (sometimes) check out. Reports throughput and
+p50/p95/p99 latency per route.
+
+    python benchmarks/storefront.py
+    python benchmarks/storefront.py --users 5000 --products 400 --orders 20000 \
+        --sessions 300 --concurrency 8 --output results.json
+    python benchmarks/storefront.py --output new.json --compare results.json
+
+Runs are reproducible for a given --seed. The JSON written by --output
+records the commit and settings next to the numbers, so runs from
+different commits can be compared with --compare.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# ---------------- SEEDING ----------------
+def seed(app, users, products, orders, rng):
+    from database import db, Users, Product, CATEGORIES, build_order
+    import analytics
+
+    with app.app_context():
+        if db.session.query(Product.id).first() is not None:
+            return
+        password = app.extensions["passwords"].hash(PASSWORD)  # one hash shared by every seeded user
+        db.session.execute(db.insert(Users), [
+            {"username": f"user{i}", "phone": f"080{i:08d}", "email": f"user{i}@bench.test", "password": password}
+            for i in range(users)
+        ])
+        db.session.execute(db.text(
+            "INSERT INTO cart (user_id, item_count, total, version, created_at, updated_at) "
+            "SELECT id, 0, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM users"
+        ))
+
+        categories = list(CATEGORIES)
+        catalog = []
+        for i in range(products):
+            category = categories[i % len(categories)]
+            catalog.append({
+                "category": category,
+                "name": f"{CATEGORIES[category]} #{i}",
+                "image": f"https://example.com/{category.lower()}/{i}.jpg",
+                "price": round(rng.uniform(2, 25), 2),
+            })
+        db.session.execute(db.insert(Product), catalog)
+
+        names = {p["name"]: p["category"] for p in catalog}
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for i in range(orders):
+            user = rng.randrange(users)
+            lines = [(p["name"], p["price"], rng.randint(1, 3)) for p in rng.sample(catalog, rng.randint(1, 4))]
+            order = build_order(f"user{user}@bench.test", f"080{user:08d}", lines, user_id=user + 1,
+                                reference=f"seed-{i}", categories=names)
+            order.created_at = now - timedelta(minutes=rng.randrange(90 * 24 * 60))
+            db.session.add(order)
+            if i % 1000 == 999:
+                db.session.flush()
+        db.session.commit()
+        analytics.rebuild_rollups()
+
+
+# ---------------- SHOPPERS ----------------
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, route, func, *args, **kwargs):
+        started = time.perf_counter()
+        response = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+
+def shopper(app, catalog, users, options, rng, recorder, serial):
+    client = app.test_client()
+    call = recorder.call
+
+    if rng.random() < options.register_ratio:
+        email = f"new{serial}@bench.test"
+        call("POST /register", client.post, "/register", data={
+            "usr": f"new{serial}", "phone": f"090{serial:08d}", "email": email,
+            "password": PASSWORD, "rep_password": PASSWORD,
+        })
+    else:
+        email = f"user{rng.randrange(users)}@bench.test"
+    call("POST /login", client.post, "/login", data={"email": email, "password": PASSWORD})
+
+    for _ in range(options.browse):
+        call("GET /", client.get, "/")
+        call("GET /categories", client.get, "/categories")
+        call("GET /api/cart_data", client.get, "/api/cart_data")
+
+    for _ in range(options.adds):
+        call("POST /add_to_cart", client.post, "/add_to_cart",
+             data={"product_id": rng.choice(catalog), "quantity": rng.randint(1, 3)})
+        call("GET /api/cart_data", client.get, "/api/cart_data")
+
+    if options.adds and rng.random() < options.checkout_ratio:
+        response = call("POST /pay", client.post, "/pay")
+        location = response.headers.get("Location", "")
+        if "/checkout/" in location:
+            # The stub marks the transaction paid and sends the buyer back
+            stub_started = time.perf_counter()
+            callback = requests.get(location, allow_redirects=False, timeout=10).headers.get("Location", "")
+            recorder.latencies["stub checkout"].append(time.perf_counter() - stub_started)
+            query = {key: values[0] for key, values in parse_qs(urlsplit(callback).query).items()}
+            call("GET /payment/callback", client.get, "/payment/callback", query_string=query)
+
+    call("GET /logout", client.get, "/logout")
+
+
+# ---------------- REPORTING ----------------
+def summarize(recorder, elapsed):
+    routes = {}
+    for route, values in sorted(recorder.latencies.items()):
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(statistics.mean(values) * 1000, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {"elapsed_s": round(elapsed, 2), "requests": total,
+            "throughput_rps": round(total / elapsed, 2), "routes": routes}
+
+
+def print_table(results, baseline=None):
+    print(f"{'route':<24}{'reqs':>7}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + ("   p95 vs base" if baseline else ""))
+    for route, row in results["routes"].items():
+        line = (f"{route:<24}{row['requests']:>7}{row['errors']:>5}{row['throughput_rps']:>9.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+        base = (baseline or {}).get("routes", {}).get(route)
+        if base and base["p95_ms"]:
+            line += f"   {(row['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100:+.1f}%"
+        print(line)
+    print(f"\n{results['requests']} requests in {results['elapsed_s']}s ({results['throughput_rps']} req/s)"
+          f", {results['orders_finalized']} orders finalized")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="seeded accounts")
+    parser.add_argument("--products", type=int, default=200, help="seeded products")
+    parser.add_argument("--orders", type=int, default=5000, help="seeded past orders")
+    parser.add_argument("--sessions", type=int, default=200, help="shopper sessions to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="shoppers running at once")
+    parser.add_argument("--browse", type=int, default=3, help="menu page views per session")
+    parser.add_argument("--adds", type=int, default=2, help="add-to-cart actions per session")
+    parser.add_argument("--register-ratio", type=float, default=0.1, help="share of sessions that register first")
+    parser.add_argument("--checkout-ratio", type=float, default=0.3, help="share of sessions that pay")
+    parser.add_argument("--paystack-latency", type=float, default=0.0, help="seconds added to each stub call")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:100000",
+                        help="PASSWORD_HASH_METHOD for the run (login cost dominates otherwise)")
+    parser.add_argument("--db", help="SQLite file to use (default: a new temporary one)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON from an earlier run to compare p95 against")
+    options = parser.parse_args()
+
+    from paystack_stub import PaystackStub
+
+    workdir = tempfile.mkdtemp(prefix="storefront-bench-")
+    stub = PaystackStub(latency=options.paystack_latency)
+    os.environ["PAYSTACK_BASE_URL"] = stub.start()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.abspath(options.db or os.path.join(workdir, "bench.db"))
+    os.environ["JOB_QUEUE_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["CATALOG_CACHE_GENERATION_DB"] = os.path.join(workdir, "catalog_generation.db")
+    os.environ["PASSWORD_HASH_METHOD"] = options.hash_method
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+
+    from app import app, jobs
+    from database import db, Product, Payment
+    import logging
+    app.logger.setLevel(logging.ERROR)
+
+    rng = random.Random(options.seed)
+    started = time.perf_counter()
+    seed(app, options.users, options.products, options.orders, rng)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s ({workdir})", file=sys.stderr)
+    with app.app_context():
+        catalog = [product_id for (product_id,) in db.session.query(Product.id)]
+
+    stop_workers = jobs.start_worker_threads(2, poll_interval=0.05)
+    recorder = Recorder()
+    serials = itertools.count()
+    serial_lock = threading.Lock()
+
+    def run_shopper():
+        while True:
+            with serial_lock:
+                serial = next(serials)
+            if serial >= options.sessions:
+                return
+            shopper(app, catalog, options.users, options, random.Random(options.seed * 100003 + serial),
+                    recorder, serial)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run_shopper) for _ in range(options.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Let the workers finish confirming the payments made during the run
+    deadline = time.time() + 30
+    while time.time() < deadline and any(jobs.stats()["counts"].get(s) for s in ("queued", "running")):
+        time.sleep(0.1)
+    stop_workers.set()
+    stub.stop()
+
+    results = summarize(recorder, elapsed)
+    with app.app_context():
+        results["orders_finalized"] = db.session.query(Payment).filter(Payment.status == "success").count()
+    results["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(options),
+    }
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+from database import db, Cart, CartItem, Product, upsert_increment
+
+# Cart writes go through these functions so that Cart.item_count and
+# Cart.total stay in step with the cart_item rows. Callers commit.
+# Prices always come from the catalog (PriceIndex), never from the client.
+
+cart_items = CartItem.__table__
+products = Product.__table__
+
+# Most units of one product a single add or set may ask for
+MAX_QUANTITY = 1000
+
+
+class PriceIndex:
+    """Every product's (id, name, price), looked up by id or by name.
+
+    Built from one catalog query; the app keeps one per catalog generation
+    in the catalog cache, so a product write is picked up by the next
+    lookup. Names are not unique, and a name resolves to the oldest
+    product carrying it.
+    """
+
+    def __init__(self, rows):
+        self.by_id = {}
+        self.by_name = {}
+        for product_id, name, price in rows:
+            self.by_id[product_id] = (product_id, name, price)
+            self.by_name.setdefault(name, product_id)
+
+    @classmethod
+    def load(cls):
+        return cls(db.session.execute(
+            db.select(products.c.id, products.c.name, products.c.price).order_by(products.c.id)
+        ))
+
+    def resolve(self, product_id=None, name=None):
+        """(id, name, price) of a product by id, else by name; None if unknown."""
+        if product_id is None and name:
+            product_id = self.by_name.get(name)
+        return self.by_id.get(product_id)
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+def refresh_totals(cart_id):
+    """Recompute the denormalized count and total of one cart in SQL."""
+    in_cart = cart_items.c.cart_id == cart_id
+    db.session.execute(
+        db.update(Cart)
+        .where(Cart.id == cart_id)
+        .values(
+            item_count=db.select(db.func.count()).where(in_cart).scalar_subquery(),
+            total=db.select(
+                db.func.coalesce(db.func.sum(cart_items.c.price * cart_items.c.quantity), 0.0)
+            ).where(in_cart).scalar_subquery(),
+            version=Cart.version + 1,
+            updated_at=db.func.current_timestamp(),
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def cart_id_for(user_id):
+    return db.session.query(Cart.id).filter(Cart.user_id == user_id).scalar()
+
+
+def load_cart(user_id):
+    """A user's cart with its items, in one joined query."""
+    return Cart.query.options(db.joinedload(Cart.items)).filter(Cart.user_id == user_id).first()
+
+
+def cart_state(user_id):
+    """(id, version, updated_at, item_count) of a user's cart, or None."""
+    return db.session.query(Cart.id, Cart.version, Cart.updated_at, Cart.item_count) \
+        .filter(Cart.user_id == user_id).first()
+
+
+def item_count(user_id):
+    """Number of distinct items in a user's cart, without loading them."""
+    return db.session.query(Cart.item_count).filter(Cart.user_id == user_id).scalar() or 0
+
+
+def _item_row(cart_id, product, quantity):
+    product_id, name, price = product
+    return {"cart_id": cart_id, "product_id": product_id, "product_name": name, "price": price, "quantity": quantity}
+
+
+def add_item(cart_id, product, quantity):
+    """Add `quantity` of a product, or increase it if already in the cart.
+
+    `product` is an (id, name, price) entry of the PriceIndex. A single
+    INSERT ... ON CONFLICT DO UPDATE on (cart_id, product_id), so
+    concurrent adds of the same product both land.
+    """
+    upsert_increment(CartItem, [_item_row(cart_id, product, quantity)], ["cart_id", "product_id"], ["quantity"])
+    refresh_totals(cart_id)
+
+
+def set_quantity(cart_id, item_id, quantity):
+    """Set an item's quantity; zero or less removes it. Returns rows touched."""
+    if quantity <= 0:
+        return remove_item(cart_id, item_id)
+    updated = CartItem.query.filter_by(id=item_id, cart_id=cart_id) \
+        .update({"quantity": quantity}, synchronize_session=False)
+    if updated:
+        refresh_totals(cart_id)
+    return updated
+
+
+def remove_item(cart_id, item_id):
+    """Delete one item from the cart. Returns rows deleted."""
+    deleted = CartItem.query.filter_by(id=item_id, cart_id=cart_id).delete(synchronize_session=False)
+    if deleted:
+        refresh_totals(cart_id)
+    return deleted
+
+
+# ---------------- CHECKOUT ----------------
+def reprice(cart_id):
+    """Bring a cart in line with the catalog before it is paid for.
+
+    Items whose product was deleted are removed and every other price is
+    reset to the product's current one, in two statements. Returns the
+    number of items changed; the totals are refreshed only if that is not 0.
+    """
+    in_cart = cart_items.c.cart_id == cart_id
+    current_price = db.select(products.c.price).where(products.c.id == cart_items.c.product_id).scalar_subquery()
+    changed = db.session.execute(
+        db.delete(cart_items).where(in_cart, cart_items.c.product_id.is_(None))
+    ).rowcount
+    changed += db.session.execute(
+        db.update(cart_items)
+        .where(in_cart, cart_items.c.price != current_price)
+        .values(price=current_price)
+    ).rowcount
+    if changed:
+        refresh_totals(cart_id)
+    return changed
+
+
+def checkout_snapshot(cart_id):
+    """(lines, total) to record on a payment, as plain column rows.
+
+    The total is the SQL-maintained Cart.total, not a sum taken here.
+    """
+    lines = [
+        {"id": item_id, "product_id": product_id, "product_name": name, "price": price, "quantity": quantity}
+        for item_id, product_id, name, price, quantity in db.session.execute(
+            db.select(cart_items.c.id, cart_items.c.product_id, cart_items.c.product_name,
+                      cart_items.c.price, cart_items.c.quantity)
+            .where(cart_items.c.cart_id == cart_id)
+            .order_by(cart_items.c.id)
+        )
+    ]
+    total = db.session.execute(db.select(Cart.total).where(Cart.id == cart_id)).scalar() or 0.0
+    return lines, total
+
+
+def remove_paid(cart_id, lines):
+    """Take the units of a paid checkout snapshot out of the cart.
+
+    Each line's quantity is subtracted from its item, so units added after
+    the snapshot was taken stay in the cart; only items left with nothing
+    are deleted. Returns the number of items deleted.
+    """
+    item_ids = [line["id"] for line in lines]
+    for line in lines:
+        db.session.execute(
+            db.update(cart_items)
+            .where(cart_items.c.id == line["id"], cart_items.c.cart_id == cart_id)
+            .values(quantity=cart_items.c.quantity - line["quantity"])
+        )
+    deleted = db.session.execute(
+        db.delete(cart_items)
+        .where(cart_items.c.cart_id == cart_id, cart_items.c.id.in_(item_ids), cart_items.c.quantity <= 0)
+    ).rowcount
+    refresh_totals(cart_id)
+    return deleted
+
+
+# ---------------- BATCHES ----------------
+def _validate(operation, index, prices):
+    if not isinstance(operation, dict):
+        raise ValueError(f"Operation {index} must be an object.")
+    op = operation.get("op")
+    if op not in ("add", "set", "remove"):
+        raise ValueError(f"Operation {index}: op must be 'add', 'set' or 'remove'.")
+    try:
+        if op == "add":
+            product_id = int(operation["product_id"]) if "product_id" in operation else None
+            name = str(operation["product_name"]).strip() if product_id is None else None
+            quantity = int(operation.get("quantity", 1))
+            if not 1 <= quantity <= MAX_QUANTITY:
+                raise ValueError
+        else:
+            item_id = int(operation["item_id"]) if "item_id" in operation else None
+            name = str(operation["product_name"]) if item_id is None else None
+            quantity = int(operation["quantity"]) if op == "set" else 0
+            if quantity > MAX_QUANTITY:
+                raise ValueError
+            return op, (item_id, name), quantity
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Operation {index}: missing or invalid fields for '{op}'.")
+    product = prices.resolve(product_id, name)
+    if product is None:
+        raise ValueError(f"Operation {index}: unknown product.")
+    return op, product, quantity
+
+
+def apply_operations(cart_id, operations, prices, max_operations=200):
+    """Apply a list of add/set/remove operations to one cart.
+
+    Everything is validated before anything is written, runs inside the
+    caller's transaction, and the cart totals are refreshed once at the
+    end. Adds name a product by `product_id` (or `product_name`) and are
+    priced from the `prices` PriceIndex; consecutive adds are sent as one
+    multi-row upsert. set/remove address an item by `item_id` or
+    `product_name`; unknown items are skipped. Returns the number of
+    units added.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list.")
+    if len(operations) > max_operations:
+        raise ValueError(f"At most {max_operations} operations per request.")
+    parsed = [_validate(operation, index, prices) for index, operation in enumerate(operations)]
+
+    pending_adds = {}
+
+    def flush_adds():
+        if pending_adds:
+            upsert_increment(CartItem, list(pending_adds.values()), ["cart_id", "product_id"], ["quantity"])
+            pending_adds.clear()
+
+    for op, target, quantity in parsed:
+        if op == "add":
+            row = pending_adds.setdefault(target[0], _item_row(cart_id, target, 0))
+            row["quantity"] += quantity
+            continue
+
+        flush_adds()
+        item_id, name = target
+        query = CartItem.query.filter(CartItem.cart_id == cart_id)
+        query = query.filter(CartItem.id == item_id) if item_id is not None else query.filter(CartItem.product_name == name)
+        if op == "remove" or quantity <= 0:
+            query.delete(synchronize_session=False)
+        else:
+            query.update({"quantity": quantity}, synchronize_session=False)
+
+    flush_adds()
+    refresh_totals(cart_id)
+    return sum(quantity for op, _, quantity in parsed if op == "add")
+
+
+def cart_payload(cart_id):
+    """The JSON shape served by /api/cart_data."""
+    cart = db.session.get(Cart, cart_id, options=[db.joinedload(Cart.items)]) if cart_id else None
+    if cart is None:
+        return {"items": [], "total": 0.0, "count": 0}
+    items = sorted(cart.items, key=lambda item: item.id)
+    return {
+        "items": [
+            {
+                "id": item.id,
+                "product_id": item.product_id,
+                "name": item.product_name,
+                "price": item.price,
+                "quantity": item.quantity,
+                "subtotal": round(item.price * item.quantity, 2),
+            }
+            for item in items
+        ],
+        "total": round(cart.total, 2),
+        "count": cart.item_count,
+    }
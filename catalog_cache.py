@@ -0,0 +1,158 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CatalogCache:
+    """Versioned in-process cache for catalog reads.
+
+    Every entry is tagged with the catalog generation it was loaded under.
+    A product write bumps the generation, so stale entries are never served
+    and nothing has to be walked to invalidate them. The number of entries
+    is bounded and the least recently used one is evicted first.
+
+    With CATALOG_CACHE_SHARED (the default) the generation counter lives in
+    a small SQLite database (CATALOG_CACHE_GENERATION_DB, default
+    instance/catalog_generation.db) so that every worker on the box sees a
+    write made by any other worker. Turned off, the counter is per process,
+    which is only right for a single worker.
+
+    `token` goes into ETags next to the generation: it is stored with a
+    shared counter and random per process otherwise, so two counters that
+    happen to reach the same number never share an ETag.
+    """
+
+    def __init__(self, max_entries=64, generation_db=None):
+        self.max_entries = max_entries
+        self.generation_db = generation_db
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+        self._token = secrets.randbits(32)
+        self._changed_at = time.time()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app, model):
+        self.max_entries = app.config.get("CATALOG_CACHE_MAX_ENTRIES", self.max_entries)
+        if app.config.get("CATALOG_CACHE_SHARED", True):
+            self.generation_db = (app.config.get("CATALOG_CACHE_GENERATION_DB") or self.generation_db
+                                  or os.path.join(app.instance_path, "catalog_generation.db"))
+        else:
+            self.generation_db = None
+        self.model = model
+        if self.generation_db:
+            os.makedirs(os.path.dirname(os.path.abspath(self.generation_db)), exist_ok=True)
+            self._shared().execute(
+                "CREATE TABLE IF NOT EXISTS generation (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._shared().execute("INSERT OR IGNORE INTO generation VALUES ('catalog', 0)")
+            self._shared().execute(
+                "INSERT OR IGNORE INTO generation VALUES ('catalog_changed_at', ?)", (int(self._changed_at),)
+            )
+            self._shared().execute("INSERT OR IGNORE INTO generation VALUES ('catalog_token', ?)", (self._token,))
+            self._token = self._shared().execute(
+                "SELECT value FROM generation WHERE name = 'catalog_token'"
+            ).fetchone()[0]
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+        app.extensions["catalog_cache"] = self
+
+    # ---------------- GENERATION COUNTER ----------------
+    def _shared(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.generation_db, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def generation(self):
+        if self.generation_db:
+            row = self._shared().execute("SELECT value FROM generation WHERE name = 'catalog'").fetchone()
+            return row[0]
+        return self._generation
+
+    @property
+    def token(self):
+        return self._token
+
+    @property
+    def changed_at(self):
+        """Unix time of the last catalog write (or of startup), for Last-Modified."""
+        if self.generation_db:
+            row = self._shared().execute(
+                "SELECT value FROM generation WHERE name = 'catalog_changed_at'"
+            ).fetchone()
+            return row[0]
+        return self._changed_at
+
+    def invalidate(self):
+        with self._lock:
+            if self.generation_db:
+                self._shared().execute("UPDATE generation SET value = value + 1 WHERE name = 'catalog'")
+                self._shared().execute(
+                    "UPDATE generation SET value = ? WHERE name = 'catalog_changed_at'", (int(time.time()),)
+                )
+            else:
+                self._generation += 1
+                self._changed_at = time.time()
+            self._entries.clear()
+            self.invalidations += 1
+
+    # ---------------- LOOKUPS ----------------
+    def get_or_load(self, key, loader):
+        generation = self.generation
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "shared": bool(self.generation_db),
+            }
+
+    # ---------------- WRITE-THROUGH INVALIDATION ----------------
+    # A flush that touches a product marks the session; the generation is
+    # only bumped once that transaction actually commits.
+    def _after_flush(self, session, flush_context):
+        changed = chain(session.new, session.dirty, session.deleted)
+        if any(isinstance(obj, self.model) for obj in changed):
+            session.info["catalog_changed"] = True
+
+    def _after_commit(self, session):
+        if session.info.pop("catalog_changed", False):
+            self.invalidate()
+
+    def _after_rollback(self, session):
+        session.info.pop("catalog_changed", None)
@@ -1,58 +1,87 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from db_config import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# SQLite stores CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS'. Binding Python
+# datetimes in that same text format keeps comparisons against stored values
+# (keyset cursors, date filters) exact instead of off by the ".000000" suffix.
+Timestamp = db.DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
 
 class Customers(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(100), unique=False, nullable=False)
+    email = db.Column(db.String(100), unique=False, nullable=False, index=True)
     phone = db.Column(db.String(100), unique=False, nullable=False)
     product = db.Column(db.Text, unique=False, nullable=False)
     quantity = db.Column(db.String(100), unique=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp())
 
     def __repr__(self):
         return f"<User {self.name}>"
 
-class Burger(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    image = db.Column(db.Text, unique=False, nullable=False)
-    name = db.Column(db.Text, unique=False, nullable=False)
-    price = db.Column(db.Float, unique=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+# Display order and section titles of the menu. Adding a category only
+# needs a new entry here - products of every category share one table.
+CATEGORIES = {
+    "Burger": "Burgers",
+    "Pizza": "Pizzas",
+    "Taco": "Tacos",
+    "Dessert": "Desserts",
+}
 
-    def __repr__(self):
-        return f"<User {self.name}>"
-
-class Pizza(db.Model):
+# ---------------- PRODUCT CATALOG ----------------
+class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
     image = db.Column(db.Text, unique=False, nullable=False)
     name = db.Column(db.Text, unique=False, nullable=False)
     price = db.Column(db.Float, unique=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    stock = db.Column(db.Integer, nullable=True)  # units left to sell; NULL = not tracked (unlimited)
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp())
+
+    # A catalog page is a single range scan over this index; carts saved
+    # before they referenced products by id are matched up by name
+    __table_args__ = (
+        db.Index("ix_product_category_created_at", "category", "created_at"),
+        db.Index("ix_product_name", "name"),
+    )
 
     def __repr__(self):
-        return f"<User {self.name}>"
+        return f"<Product {self.category} {self.name}>"
 
-class Taco(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    image = db.Column(db.Text, unique=False, nullable=False)
-    name = db.Column(db.Text, unique=False, nullable=False)
-    price = db.Column(db.Float, unique=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
-    def __repr__(self):
-        return f"<User {self.name}>"
+# Tables used before the unified catalog, mapped to their category
+LEGACY_PRODUCT_TABLES = {
+    "burger": "Burger",
+    "pizza": "Pizza",
+    "taco": "Taco",
+    "dessert": "Dessert",
+}
 
-class Dessert(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    image = db.Column(db.Text, unique=False, nullable=False)
-    name = db.Column(db.Text, unique=False, nullable=False)
-    price = db.Column(db.Float, unique=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+def migrate_legacy_products():
+    """Move rows from the old per-category tables into `product`.
 
-    def __repr__(self):
-        return f"<User {self.name}>"
+    Safe to run repeatedly: each legacy table is dropped once its rows are
+    copied, so a second run finds nothing to do.
+    """
+    inspector = db.inspect(db.engine)
+    moved = 0
+    for table, category in LEGACY_PRODUCT_TABLES.items():
+        if not inspector.has_table(table):
+            continue
+        result = db.session.execute(db.text(
+            "INSERT INTO product (category, image, name, price, created_at) "
+            f"SELECT :category, image, name, price, created_at FROM {table}"
+        ), {"category": category})
+        moved += result.rowcount
+        db.session.execute(db.text(f"DROP TABLE {table}"))
+    db.session.commit()
+    return moved
 
 # login
 class Users(UserMixin, db.Model):
@@ -64,29 +93,227 @@ class Users(UserMixin, db.Model):
     s_admin = db.Column(db.Boolean, default=False)
     password = db.Column(db.Text, nullable=False)
 
-    cart = db.relationship("Cart", backref="user", uselist=False)
+    # Cart rows are removed by ON DELETE CASCADE; the ORM does not load them first
+    cart = db.relationship("Cart", backref="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp())
+
+    # Denormalized by cart_service.refresh_totals() on every cart write
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    # Bumped on every write; the cart's HTTP validators are built from these
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(Timestamp, default=db.func.current_timestamp())
 
   # one-to-many relationship (a cart can have many items)
-    items = db.relationship("CartItem", backref="cart", lazy=True)
+    items = db.relationship("CartItem", backref="cart", lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
     def total_cost(self):
-        return sum(item.price * item.quantity for item in self.items)
+        return self.total or 0.0
 
 
 # ---------------- CART ITEM ----------------
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey("cart.id"), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey("cart.id", ondelete="CASCADE"), nullable=False)
+    # NULL once the product is deleted; such items are dropped at checkout
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="SET NULL"), nullable=True)
     product_name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # the catalog price, resolved server-side
     quantity = db.Column(db.Integer, default=1)
-    added_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    added_at = db.Column(Timestamp, default=db.func.current_timestamp())
+
+    # One row per product per cart; adding again increments the quantity
+    __table_args__ = (
+        db.Index("uq_cart_item_cart_product_id", "cart_id", "product_id", unique=True),
+        db.Index("ix_cart_item_product_id", "product_id"),  # for ON DELETE SET NULL
+    )
+
+    def __repr__(self):
+        return f"<Item {self.product_name} (x{self.quantity})>"
+
+
+# ---------------- ORDERS ----------------
+class Order(db.Model):
+    __tablename__ = "orders"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    email = db.Column(db.String(100), nullable=False, index=True)
+    phone = db.Column(db.String(100), nullable=False)
+    reference = db.Column(db.String(100), unique=True, nullable=True)  # Paystack transaction reference
+    item_count = db.Column(db.Integer, nullable=False, default=0)      # total units across all lines
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp(), index=True)
+    legacy_customer_id = db.Column(db.Integer, unique=True, nullable=True)  # set by backfill_orders()
+
+    lines = db.relationship("OrderLine", backref="order", lazy=True, cascade="all, delete-orphan")
+
+    @property
+    def summary(self):
+        return ", ".join(f"{line.product_name} x{line.quantity}" for line in self.lines)
+
+    def __repr__(self):
+        return f"<Order {self.id} {self.email} ${self.total}>"
+
+
+class OrderLine(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=True)
+    product_name = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(50), nullable=True)
+    unit_price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    line_total = db.Column(db.Float, nullable=False)
 
     def __repr__(self):
-        return f"<Item {self.product_name} (x{self.quantity})>"
\ No newline at end of file
+        return f"<OrderLine {self.product_name} (x{self.quantity})>"
+
+
+def product_categories(names=None):
+    query = db.session.query(Product.name, Product.category)
+    if names is not None:
+        query = query.filter(Product.name.in_(set(names)))
+    return dict(query.all())
+
+def build_order(email, phone, lines, user_id=None, reference=None, categories=None):
+    """Create an Order from (product_name, unit_price, quantity) tuples."""
+    order = Order(user_id=user_id, email=email, phone=phone, reference=reference)
+    if categories is None:
+        categories = product_categories(name for name, _, _ in lines)
+    for name, unit_price, quantity in lines:
+        order.lines.append(OrderLine(
+            product_name=name,
+            category=categories.get(name),
+            unit_price=unit_price,
+            quantity=quantity,
+            line_total=round(unit_price * quantity, 2),
+        ))
+    order.item_count = sum(line.quantity for line in order.lines)
+    order.total = round(sum(line.line_total for line in order.lines), 2)
+    return order
+
+
+# ---------------- PAYMENTS ----------------
+# One row per Paystack transaction reference. Finalizing a payment flips
+# it from "pending" in the same transaction that records the order, which
+# makes the callback, the webhook and reconciliation safe to race.
+class Payment(db.Model):
+    reference = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    email = db.Column(db.String(100), nullable=False)
+    amount_kobo = db.Column(db.Integer, nullable=False)
+    lines = db.Column(db.JSON, nullable=False)  # cart snapshot taken when payment was initialized
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending / success / failed
+    order_id = db.Column(db.Integer, db.ForeignKey("orders.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp())
+    finalized_at = db.Column(Timestamp, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_payment_status_created_at", "status", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Payment {self.reference} {self.status}>"
+
+
+# ---------------- INVENTORY ----------------
+# Stock taken off a product when its payment is initialized. The hold is
+# committed when the payment succeeds, or released (and the stock given
+# back) when it fails or `expires_at` passes first; see inventory.py.
+class StockReservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    payment_reference = db.Column(db.String(100), db.ForeignKey("payment.reference", ondelete="CASCADE"),
+                                  nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="held")  # held / committed / released
+    expires_at = db.Column(Timestamp, nullable=False)
+    created_at = db.Column(Timestamp, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index("ix_stock_reservation_status_expires_at", "status", "expires_at"),
+    )
+
+    def __repr__(self):
+        return f"<StockReservation {self.payment_reference} product={self.product_id} x{self.quantity} {self.status}>"
+
+
+# ---------------- SALES ROLLUPS ----------------
+# Maintained incrementally by analytics.record_order(); rebuilt from the
+# order history by analytics.rebuild_rollups().
+class DailySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class ProductSales(db.Model):
+    product_name = db.Column(db.String(100), primary_key=True)
+    category = db.Column(db.String(50), nullable=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
+
+class CategorySales(db.Model):
+    category = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)  # orders containing this category
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+def upsert_increment(model, rows, conflict_columns, increment_columns):
+    """Insert `rows`, or add their values onto the existing row on conflict.
+
+    Runs as a single INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY
+    UPDATE on MySQL), so concurrent writers never lose an increment.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in increment_columns},
+        )
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in increment_columns})
+    else:
+        raise NotImplementedError(f"upsert_increment is not supported on {dialect}")
+    return db.session.execute(stmt, rows)
+
+
+# Customers.product holds entries like "Street Tacos x1 ($4.0), Gourmet Pizza x2 ($12.0)"
+LEGACY_LINE = re.compile(r"(.+?) x(\d+) \(\$([\d.]+)\)(?:, |$)")
+
+def parse_legacy_products(text):
+    return [(name, float(price), int(quantity)) for name, quantity, price in LEGACY_LINE.findall(text)]
+
+def backfill_orders(batch_size=500):
+    """Copy legacy Customers rows into Order/OrderLine.
+
+    Only rows newer than the last one already copied are read, so this can
+    run on every start and only does work the first time.
+    """
+    last = db.session.query(db.func.max(Order.legacy_customer_id)).scalar() or 0
+    query = Customers.query.filter(Customers.id > last).order_by(Customers.id)
+    categories = product_categories()
+    copied = 0
+    for customer in query.yield_per(batch_size):
+        lines = parse_legacy_products(customer.product)
+        order = build_order(customer.email, customer.phone, lines, categories=categories)
+        order.created_at = customer.created_at
+        order.legacy_customer_id = customer.id
+        db.session.add(order)
+        copied += 1
+    db.session.commit()
+    return copied
@@ -0,0 +1,139 @@
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Bind key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA = "replica"
+
+# Applied to every SQLite connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across application crashes in WAL.
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",      # enforces the ON DELETE rules on cart and order rows
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,      # ms to wait for the write lock instead of failing
+    "cache_size": -20000,      # KiB of page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": 134217728,
+}
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+# ---------------- ENGINE OPTIONS ----------------
+def _engine_options(url, config):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}
+        # One writer at a time; a small pool avoids piling up blocked writers
+        return {
+            "pool_size": config.get("DB_POOL_SIZE", 5),
+            "max_overflow": 0,
+            "pool_timeout": config.get("DB_POOL_TIMEOUT", 30),
+            "connect_args": {"timeout": 30},
+        }
+    return {
+        "pool_size": config.get("DB_POOL_SIZE", 10),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),  # below server-side idle timeouts
+        "pool_pre_ping": True,
+    }
+
+
+def configure_engines(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS / SQLALCHEMY_BINDS before db.init_app().
+
+    DATABASE_REPLICA_URL, when set, becomes the `replica` bind used by
+    `read_replica` views.
+    """
+    config = app.config
+    config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).update(
+        _engine_options(config["SQLALCHEMY_DATABASE_URI"], config)
+    )
+    replica_url = config.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        config.setdefault("SQLALCHEMY_BINDS", {})[REPLICA] = {
+            "url": replica_url, **_engine_options(replica_url, config),
+        }
+
+
+def init_sqlite(db, pragmas=SQLITE_PRAGMAS):
+    """Apply `pragmas` to new connections of every SQLite engine.
+
+    The replica is also made read-only, so a write that is routed there by
+    mistake fails loudly instead of diverging from the primary.
+    """
+    for key, engine in db.engines.items():
+        if engine.dialect.name != "sqlite":
+            continue
+        statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+        if key == REPLICA:
+            statements.append("PRAGMA query_only=ON")
+
+        def on_connect(dbapi_connection, connection_record, statements=statements):
+            cursor = dbapi_connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+
+        event.listen(engine, "connect", on_connect)
+
+
+# ---------------- READ/WRITE ROUTING ----------------
+class RoutingSession(Session):
+    """Session that sends SELECTs to the replica inside `read_replica` code.
+
+    Anything else - writes, flushes, raw SQL - goes to the primary, and once
+    a session has written, its later reads stay on the primary so a request
+    always sees its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _replica_reads.get() and REPLICA in self._db.engines:
+            if self._flushing or not getattr(clause, "is_select", False):
+                self.info["wrote"] = True
+            elif not self.info.get("wrote"):
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_replica(f):
+    """Serve the view's reads from the replica (when one is configured)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with replica_reads():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+# ---------------- LOCAL REPLICA STAND-IN ----------------
+def sync_sqlite_replica(db):
+    """Copy the SQLite primary onto the SQLite replica with the backup API.
+
+    Stands in for real replication when testing the routing locally.
+    """
+    primary, replica = db.engines[None].url.database, db.engines[REPLICA].url.database
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    db.engines[REPLICA].dispose()
@@ -0,0 +1,125 @@
+"""Streaming CSV / NDJSON exports of the order, customer and user tables.
+
+Each export is a single Core SELECT executed with `yield_per`, so rows come
+off a server-side cursor in fixed-size batches and are written out as they
+arrive: memory stays flat however many years of history are exported.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from database import db, Users, Order, OrderLine
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+BATCH_SIZE = 1000
+
+
+# ---------------- QUERIES ----------------
+# name -> (select, column the date range filters on)
+def _orders():
+    return db.select(
+        Order.id, Order.reference, Order.user_id, Order.email, Order.phone,
+        Order.item_count, Order.total, Order.created_at,
+    ).order_by(Order.id), Order.created_at
+
+
+def _order_lines():
+    return db.select(
+        OrderLine.order_id, Order.reference, Order.email, Order.created_at,
+        OrderLine.product_name, OrderLine.category, OrderLine.unit_price,
+        OrderLine.quantity, OrderLine.line_total,
+    ).join(Order, Order.id == OrderLine.order_id).order_by(OrderLine.order_id, OrderLine.id), Order.created_at
+
+
+def _customers():
+    # One row per buyer email, aggregated over their orders in the range
+    return db.select(
+        Order.email,
+        db.func.max(Order.phone).label("phone"),
+        db.func.count(Order.id).label("orders"),
+        db.func.sum(Order.item_count).label("items"),
+        db.func.round(db.func.sum(Order.total), 2).label("total_spent"),
+        db.func.min(Order.created_at).label("first_order_at"),
+        db.func.max(Order.created_at).label("last_order_at"),
+    ).group_by(Order.email).order_by(Order.email), Order.created_at
+
+
+def _users():
+    return db.select(
+        Users.id, Users.username, Users.email, Users.phone, Users.is_admin, Users.s_admin,
+    ).order_by(Users.id), None
+
+
+EXPORTS = {
+    "orders": _orders,
+    "order_lines": _order_lines,
+    "customers": _customers,
+    "users": _users,
+}
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD).")
+
+
+def build_query(name, start=None, end=None):
+    """The SELECT for export `name`, limited to [start, end] (dates, inclusive)."""
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export {name!r}; choose from {', '.join(EXPORTS)}.")
+    query, date_column = EXPORTS[name]()
+    if (start or end) and date_column is None:
+        raise ValueError(f"The {name} export has no date to filter on.")
+    if start:
+        query = query.where(date_column >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.where(date_column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+# ---------------- ENCODING ----------------
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def stream(query, fmt="csv", batch_size=BATCH_SIZE):
+    """Yield the result of `query` as CSV or NDJSON text, one chunk per batch.
+
+    Runs on the current session's connection; call it inside an app context
+    (or `stream_with_context`) for as long as the generator is consumed.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}.")
+    result = db.session.execute(query, execution_options={"yield_per": batch_size})
+    columns = list(result.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(columns)
+    for rows in result.partitions():
+        for row in rows:
+            if fmt == "csv":
+                writer.writerow([_value(v) for v in row])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, map(_value, row)))))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if fmt == "csv" and buffer.tell():
+        yield buffer.getvalue()
+
+
+def filename(name, fmt, start=None, end=None):
+    span = "-".join(d.isoformat() for d in (start, end) if d)
+    return f"{name}{'-' + span if span else ''}.{fmt}"
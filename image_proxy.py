@@ -0,0 +1,301 @@
+"""Product image proxy with a size-bounded thumbnail cache on disk.
+
+Each origin image is fetched once. It is kept as the "original" entry and
+resized into the named sizes on demand (WebP when the client accepts it,
+JPEG otherwise). Without Pillow the original is served as is, so the
+proxy still saves the repeated origin fetches. Entries are files named by
+a hash of (url, variant). A read refreshes the file's mtime. When the
+cache grows past max_bytes the least recently used files are deleted,
+down to 90% of the limit (never the entry just written). Lookups hand
+back an open file or the bytes just built, never a path, so eviction
+can't pull a file out from under a response. An origin that fails is
+not retried for failure_ttl seconds.
+
+Origins can be http(s) URLs, site paths under the static folder
+("/static/img/x.jpg") and, with IMAGE_ALLOW_LOCAL_FILES, file:// URLs. The
+last two make the proxy testable without a network.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+import requests
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Only raster formats we can recognise are served from our origin (no SVG: it can carry script)
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def sniff(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mimetype in SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    return None
+
+
+def image_version(url):
+    """Short hash of an image URL, used in proxy URLs so a changed image gets a new URL."""
+    return hashlib.sha1((url or "").encode()).hexdigest()[:10]
+
+
+class ImageCache:
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024, sizes=None, timeout=(3.05, 10.0),
+                 max_source_bytes=10 * 1024 * 1024, quality=80, allow_local_files=False, failure_ttl=300):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.sizes = sizes or {"thumb": 80, "card": 480, "large": 1200}
+        self.timeout = timeout
+        self.max_source_bytes = max_source_bytes
+        self.quality = quality
+        self.allow_local_files = allow_local_files
+        self.failure_ttl = failure_ttl  # seconds a failed origin is not retried
+        self.static_folder = None
+        self.static_url_path = None
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Striped by key hash: bounded, and a lock is never replaced while held
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self._failures = {}
+        self._session = requests.Session()
+
+    def init_app(self, app):
+        config = app.config
+        self.cache_dir = config.get("IMAGE_CACHE_DIR") or os.path.join(app.instance_path, "image_cache")
+        self.max_bytes = config.get("IMAGE_CACHE_MAX_BYTES", self.max_bytes)
+        self.sizes = config.get("IMAGE_SIZES", self.sizes)
+        self.timeout = config.get("IMAGE_FETCH_TIMEOUT", self.timeout)
+        self.max_source_bytes = config.get("IMAGE_MAX_SOURCE_BYTES", self.max_source_bytes)
+        self.quality = config.get("IMAGE_QUALITY", self.quality)
+        self.allow_local_files = config.get("IMAGE_ALLOW_LOCAL_FILES", self.allow_local_files)
+        self.static_folder = app.static_folder
+        self.static_url_path = app.static_url_path
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._entries())
+        app.extensions["image_cache"] = self
+
+    @property
+    def can_resize(self):
+        return Image is not None
+
+    # ---------------- LOOKUPS ----------------
+    def get(self, url, size, webp=False):
+        """(file, mimetype) of `url` at the named size, fetching and resizing on a miss.
+
+        The file is open for reading; the caller closes it.
+        """
+        if size not in self.sizes:
+            raise KeyError(size)
+        if not self.can_resize:
+            return self._original(url)
+        fmt = "webp" if webp else "jpeg"
+        path = self._path(url, f"{size}.{fmt}")
+        f = self._open(path)
+        if f is None:
+            # Read the original before taking this key's lock: locks are never nested
+            original = self._original_bytes(url)
+            with self._key_lock(path):
+                f = self._open(path, count=False)
+                if f is None:
+                    data = self._resize(original, self.sizes[size], fmt)
+                    self._store(path, data)
+                    f = io.BytesIO(data)
+        return f, f"image/{fmt}"
+
+    def prewarm(self, url, sizes=None):
+        """Fetch `url` and build every size (both formats) ahead of the first visitor."""
+        for size in sizes or self.sizes:
+            self.get(url, size, webp=False)[0].close()
+            if self.can_resize:
+                self.get(url, size, webp=True)[0].close()
+
+    def _original(self, url):
+        f = self._open(self._path(url, "original"))
+        if f is None:
+            data = self._original_bytes(url)
+            return io.BytesIO(data), sniff(data)
+        head = f.read(16)
+        f.seek(0)
+        return f, sniff(head)
+
+    def _original_bytes(self, url):
+        path = self._path(url, "original")
+        f = self._open(path, count=False)
+        if f is None:
+            with self._key_lock(path):
+                f = self._open(path, count=False)
+                if f is None:
+                    data = self._fetch(url)
+                    self._store(path, data)
+                    return data
+        with f:
+            return f.read()
+
+    def _resize(self, data, width, fmt):
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == "webp":
+                image.save(out, "WEBP", quality=self.quality, method=4)
+            else:
+                image.save(out, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            return out.getvalue()
+
+    # ---------------- ORIGIN ----------------
+    def _fetch(self, url):
+        failed = self._failures.get(url)
+        if failed and time.time() - failed[0] < self.failure_ttl:
+            raise ImageFetchError(failed[1])
+        try:
+            data = self._fetch_origin(url)
+        except ImageFetchError as e:
+            self._failures[url] = (time.time(), str(e))
+            raise
+        self._failures.pop(url, None)
+        return data
+
+    def _fetch_origin(self, url):
+        self.fetches += 1
+        parts = urlsplit(url or "")
+        if parts.scheme in ("http", "https"):
+            try:
+                with self._session.get(url, timeout=self.timeout, stream=True) as response:
+                    if response.status_code != 200:
+                        raise ImageFetchError(f"Origin returned HTTP {response.status_code}")
+                    data = bytearray()
+                    for chunk in response.iter_content(64 * 1024):
+                        data += chunk
+                        if len(data) > self.max_source_bytes:
+                            raise ImageFetchError("Image is larger than IMAGE_MAX_SOURCE_BYTES")
+                    data = bytes(data)
+            except requests.RequestException as e:
+                raise ImageFetchError(f"Fetching {url} failed: {e}") from e
+        else:
+            if parts.scheme == "file" and self.allow_local_files:
+                path = url2pathname(parts.path)
+            elif not parts.scheme and parts.path.startswith(self.static_url_path + "/"):
+                path = safe_join(self.static_folder, parts.path[len(self.static_url_path) + 1:])
+            else:
+                raise ImageFetchError(f"Unsupported image URL: {url!r}")
+            if not path or not os.path.isfile(path) or os.path.getsize(path) > self.max_source_bytes:
+                raise ImageFetchError(f"No usable image at {url!r}")
+            with open(path, "rb") as f:
+                data = f.read()
+        if sniff(data) is None:
+            raise ImageFetchError(f"{url} is not a JPEG, PNG, GIF or WebP image")
+        return data
+
+    # ---------------- DISK / LRU ----------------
+    def _path(self, url, variant):
+        key = hashlib.sha256(f"{url}\n{variant}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _key_lock(self, path):
+        return self._key_locks[int(os.path.basename(path)[:8], 16) % len(self._key_locks)]
+
+    def _open(self, path, count=True):
+        """The cached file opened for reading, or None on a miss.
+
+        Once open, the file stays readable even if eviction deletes it.
+        """
+        try:
+            f = open(path, "rb")
+        except OSError:
+            if count:
+                self.misses += 1
+            return None
+        if count:
+            self.hits += 1
+        now = time.time()
+        if now - os.fstat(f.fileno()).st_mtime > 60:  # recency only needs to be coarse; spare the writes
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return f
+
+    def _store(self, path, data):
+        """Write an entry; callers hold its key lock, so writers of one path never overlap."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self._bytes += len(data) - replaced
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict(keep=path)
+
+    def _entries(self):
+        for directory in os.scandir(self.cache_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self, keep=None):
+        """Delete least recently used files until the cache is under 90% of max_bytes.
+
+        `keep` (the entry just stored) is never deleted, even if it alone
+        is over the limit.
+        """
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._bytes = total
+
+    def stats(self):
+        return {
+            "files": sum(1 for _ in self._entries()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "origin_fetches": self.fetches,
+            "evictions": self.evictions,
+            "resizing": self.can_resize,
+        }
@@ -0,0 +1,167 @@
+"""Stock levels and checkout reservations.
+
+`product.stock` counts the units still available to sell (NULL means the
+product is not tracked). Every change is one conditional UPDATE evaluated
+by the database, e.g.
+
+    UPDATE product SET stock = stock - 2 WHERE id = 7 AND stock >= 2
+
+so concurrent checkouts can never both take the last unit and nothing is
+read into Python and written back. Reservation rows move out of "held"
+with the same kind of conditional UPDATE, so the callback, the webhook
+and the expiry sweep can race over a payment and the stock still moves
+exactly once.
+"""
+from datetime import timedelta
+
+from database import db, Product, StockReservation
+import analytics
+
+products = Product.__table__
+reservations = StockReservation.__table__
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_name, available):
+        self.product_name = product_name
+        self.available = max(available or 0, 0)
+        if self.available:
+            message = f"Only {self.available} {product_name} left. Please update your cart."
+        else:
+            message = f"{product_name} is sold out. Please remove it from your cart."
+        super().__init__(message)
+
+
+def _tracked(lines):
+    """{product_id: (name, quantity)} for the stock-tracked products among (product_id, quantity) lines."""
+    wanted = {}
+    for product_id, quantity in lines:
+        if product_id is not None:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+    if not wanted:
+        return {}
+    rows = db.session.execute(
+        db.select(products.c.id, products.c.name)
+        .where(products.c.id.in_(list(wanted)), products.c.stock.isnot(None))
+    )
+    return {product_id: (name, wanted[product_id]) for product_id, name in rows}
+
+
+# ---------------- RESERVING ----------------
+def reserve(reference, lines, ttl):
+    """Hold stock for payment `reference`; `lines` are (product_id, quantity).
+
+    Runs in the caller's transaction. Raises OutOfStock if any product is
+    short, in which case the caller must roll back so the holds already
+    taken are undone with it.
+    """
+    tracked = _tracked(lines)
+    expires_at = analytics.utcnow() + timedelta(seconds=ttl)
+    held = []
+    # Always lock rows in id order so two checkouts can't deadlock each other
+    for product_id in sorted(tracked):
+        name, quantity = tracked[product_id]
+        taken = db.session.execute(
+            db.update(products)
+            .where(products.c.id == product_id, products.c.stock >= quantity)
+            .values(stock=products.c.stock - quantity)
+        ).rowcount
+        if not taken:
+            available = db.session.execute(
+                db.select(products.c.stock).where(products.c.id == product_id)
+            ).scalar()
+            raise OutOfStock(name, available)
+        held.append({"payment_reference": reference, "product_id": product_id, "quantity": quantity,
+                     "status": "held", "expires_at": expires_at})
+    if held:
+        db.session.execute(db.insert(reservations), held)
+    return len(held)
+
+
+# ---------------- SETTLING ----------------
+def _move(reference_filter, from_status, to_status, stock_delta):
+    """Move matching reservations between statuses, one conditional UPDATE each.
+
+    `stock_delta` (+1 gives the units back, -1 takes them again, 0 leaves
+    stock alone) is applied only for rows this call actually moved.
+    Returns the number of reservations moved.
+    """
+    rows = db.session.execute(
+        db.select(reservations.c.id, reservations.c.product_id, reservations.c.quantity)
+        .where(reference_filter, reservations.c.status == from_status)
+    ).all()
+    moved = 0
+    for reservation_id, product_id, quantity in rows:
+        claimed = db.session.execute(
+            db.update(reservations)
+            .where(reservations.c.id == reservation_id, reservations.c.status == from_status)
+            .values(status=to_status)
+        ).rowcount
+        if not claimed:
+            continue  # someone else settled it first
+        moved += 1
+        if stock_delta:
+            db.session.execute(
+                db.update(products)
+                .where(products.c.id == product_id, products.c.stock.isnot(None))
+                .values(stock=products.c.stock + stock_delta * quantity)
+            )
+    return moved
+
+
+def commit(reference):
+    """Make a paid payment's holds permanent, in the caller's transaction.
+
+    A hold that already expired gave its stock back; the buyer has paid,
+    so the units are taken again even if that drives stock negative (an
+    oversell the admin can see, rather than a lost order).
+    """
+    by_reference = reservations.c.payment_reference == reference
+    return _move(by_reference, "held", "committed", 0) + _move(by_reference, "released", "committed", -1)
+
+
+def release(reference):
+    """Give back the stock held for a failed or abandoned payment, in the caller's transaction."""
+    return _move(reservations.c.payment_reference == reference, "held", "released", +1)
+
+
+def release_expired(limit=500):
+    """Release holds whose TTL has passed. Commits; returns the number released."""
+    references = db.session.execute(
+        db.select(reservations.c.payment_reference).distinct()
+        .where(reservations.c.status == "held", reservations.c.expires_at <= analytics.utcnow())
+        .limit(limit)
+    ).scalars().all()
+    released = 0
+    for reference in references:
+        released += _move(
+            db.and_(reservations.c.payment_reference == reference,
+                    reservations.c.expires_at <= analytics.utcnow()),
+            "held", "released", +1,
+        )
+        db.session.commit()
+    return released
+
+
+# ---------------- ADMIN ----------------
+def set_stock(product_id, stock):
+    """Set a product's stock (None stops tracking it). Returns rows updated."""
+    return db.session.execute(
+        db.update(products).where(products.c.id == product_id).values(stock=stock)
+    ).rowcount
+
+
+def add_stock(product_id, quantity):
+    """Add (or remove, with a negative quantity) units atomically.
+
+    Returns the new level, or None when the product is not tracked or
+    would drop below zero.
+    """
+    updated = db.session.execute(
+        db.update(products)
+        .where(products.c.id == product_id, products.c.stock.isnot(None), products.c.stock + quantity >= 0)
+        .values(stock=products.c.stock + quantity)
+    ).rowcount
+    if not updated:
+        return None
+    return db.session.execute(db.select(products.c.stock).where(products.c.id == product_id)).scalar()
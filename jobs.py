@@ -0,0 +1,260 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued / running / done / dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration_ms REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_name_status ON jobs (name, status);
+"""
+
+
+class Task:
+    def __init__(self, name, func, max_attempts, timeout):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+
+class JobQueue:
+    """Persistent job queue stored in its own SQLite file.
+
+    Jobs are claimed with BEGIN IMMEDIATE, so any number of worker threads
+    or processes on the box can share one queue file without a broker. A
+    failed job is retried with exponential backoff until `max_attempts`,
+    then kept as a dead letter. A job still running after its `timeout` is
+    abandoned and counts as a failed attempt; a job whose worker died is
+    handed out again once its `timeout` has passed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.app = None
+        self.tasks = {}
+        self.periodic = {}
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config.get("JOB_QUEUE_DB") or os.path.join(app.instance_path, "jobs.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+        app.extensions["jobs"] = self
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # ---------------- REGISTRATION ----------------
+    def task(self, name, max_attempts=5, timeout=60):
+        def decorator(func):
+            self.tasks[name] = Task(name, func, max_attempts, timeout)
+            return func
+        return decorator
+
+    def every(self, interval, name, **payload):
+        """Keep one `name` job scheduled every `interval` seconds while workers run."""
+        self.periodic[name] = (interval, payload)
+
+    # ---------------- PRODUCING ----------------
+    def enqueue(self, name, delay=0, **payload):
+        task = self.tasks[name]
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (name, payload, max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (name, json.dumps(payload), task.max_attempts, now + delay, now),
+        )
+        return cursor.lastrowid
+
+    def _schedule_periodic(self):
+        conn = self._conn()
+        for name, (interval, payload) in self.periodic.items():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = conn.execute(
+                    "SELECT 1 FROM jobs WHERE name = ? AND status IN ('queued', 'running') LIMIT 1", (name,)
+                ).fetchone()
+                if not pending:
+                    last = conn.execute(
+                        "SELECT MAX(finished_at) FROM jobs WHERE name = ?", (name,)
+                    ).fetchone()[0]
+                    run_at = max(time.time(), (last or 0) + interval)
+                    conn.execute(
+                        "INSERT INTO jobs (name, payload, max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (name, json.dumps(payload), self.tasks[name].max_attempts, run_at, time.time()),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ---------------- CONSUMING ----------------
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_at <= ? ORDER BY run_at LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                # A worker that died mid-job leaves it 'running' past its lock
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'running' AND locked_until < ? ORDER BY run_at LIMIT 1", (now,)
+                ).fetchone()
+            if row is not None:
+                task = self.tasks.get(row["name"])
+                timeout = task.timeout if task else 60
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, locked_until = ? "
+                    "WHERE id = ?",
+                    (now, now + timeout, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def run_one(self):
+        """Claim and run one due job. Returns False when nothing was due."""
+        row = self._claim()
+        if row is None:
+            return False
+
+        conn = self._conn()
+        attempts = row["attempts"] + 1
+        task = self.tasks.get(row["name"])
+        started = time.perf_counter()
+        if task is None:
+            error = f"LookupError: No task registered as {row['name']!r}"
+        else:
+            error = self._call(task, row)
+        if error is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if attempts >= row["max_attempts"] or task is None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'dead', finished_at = ?, duration_ms = ?, last_error = ? WHERE id = ?",
+                    (time.time(), duration_ms, error, row["id"]),
+                )
+                self.app.logger.error("Job %s (%s) dead-lettered after %s attempts", row["id"], row["name"], attempts)
+            else:
+                backoff = min(2 ** attempts, 300)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', run_at = ?, duration_ms = ?, last_error = ? WHERE id = ?",
+                    (time.time() + backoff, duration_ms, error, row["id"]),
+                )
+            return True
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        conn.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, duration_ms = ?, last_error = NULL WHERE id = ?",
+            (time.time(), duration_ms, row["id"]),
+        )
+        return True
+
+    def _call(self, task, row):
+        """Run one job under its task's timeout. Returns None, or the error text.
+
+        The task runs on its own daemon thread so the worker can stop waiting
+        for it. A thread cannot be killed, so one that overruns is left to
+        finish in the background; tasks should bound their own I/O as well.
+        """
+        outcome = []
+
+        def target():
+            try:
+                with self.app.app_context():
+                    task.func(**json.loads(row["payload"]))
+                outcome.append(None)
+            except Exception:
+                outcome.append(traceback.format_exc(limit=5))
+
+        thread = threading.Thread(target=target, name=f"job-{row['id']}", daemon=True)
+        thread.start()
+        thread.join(task.timeout)
+        if thread.is_alive():
+            self.app.logger.warning("Job %s (%s) still running after its %ss timeout; abandoned",
+                                    row["id"], row["name"], task.timeout)
+            return f"TimeoutError: still running after {task.timeout}s"
+        return outcome[0]
+
+    def work(self, stop=None, poll_interval=1.0, burst=False):
+        """Process jobs until `stop` is set (or the queue is empty, with burst=True)."""
+        stop = stop or threading.Event()
+        last_purge = 0
+        while not stop.is_set():
+            self._schedule_periodic()
+            if time.time() - last_purge > 3600:
+                self.purge()
+                last_purge = time.time()
+            while not stop.is_set() and self.run_one():
+                pass
+            if burst:
+                return
+            stop.wait(poll_interval)
+
+    def start_worker_threads(self, count=1, poll_interval=1.0):
+        stop = threading.Event()
+        for i in range(count):
+            threading.Thread(target=self.work, args=(stop, poll_interval),
+                             name=f"job-worker-{i}", daemon=True).start()
+        return stop
+
+    # ---------------- ADMIN ----------------
+    def purge(self, older_than=7 * 86400):
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status = 'done' AND finished_at < ?", (time.time() - older_than,)
+        )
+
+    def retry_dead(self, job_id=None):
+        query = "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ? WHERE status = 'dead'"
+        params = [time.time()]
+        if job_id is not None:
+            query += " AND id = ?"
+            params.append(job_id)
+        return self._conn().execute(query, params).rowcount
+
+    def stats(self):
+        conn = self._conn()
+        counts = {row["status"]: row["n"] for row in conn.execute(
+            "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+        )}
+        timings = {row["name"]: {
+            "runs": row["runs"],
+            "avg_ms": round(row["avg_ms"], 2),
+            "max_ms": round(row["max_ms"], 2),
+        } for row in conn.execute(
+            "SELECT name, COUNT(*) AS runs, AVG(duration_ms) AS avg_ms, MAX(duration_ms) AS max_ms "
+            "FROM jobs WHERE status = 'done' GROUP BY name"
+        )}
+        dead = [dict(row) for row in conn.execute(
+            "SELECT id, name, payload, attempts, last_error, finished_at FROM jobs "
+            "WHERE status = 'dead' ORDER BY id DESC LIMIT 20"
+        )]
+        return {"counts": counts, "timings": timings, "dead": dead}
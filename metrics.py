@@ -0,0 +1,186 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, request
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Shard:
+    """One thread's counters and histograms. Only its owner thread writes it."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.values = defaultdict(float)   # (name, labels) -> value
+        self.histograms = {}               # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+class Metrics:
+    """Prometheus text-format metrics with per-thread aggregation.
+
+    Every thread updates its own shard, so recording a metric takes no
+    lock; the shards are only summed when /metrics is scraped. Shards of
+    threads that have exited are folded into a single retired shard so
+    per-request threads do not pile up.
+
+    Counters and gauges are declared with `describe()`; values that are
+    read rather than recorded (pool usage, queue depth) are exported by
+    collector callbacks registered with `collector()`.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._meta = {}
+        self._collectors = []
+        self._shards = []
+        self._retired = Shard(None)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.buckets = tuple(app.config.get("METRICS_BUCKETS", self.buckets))
+        self.describe("http_requests_total", "counter", "HTTP requests by endpoint, method and status.")
+        self.describe("http_request_duration_seconds", "histogram", "HTTP request latency by endpoint.")
+        self.describe("http_requests_in_flight", "gauge", "HTTP requests currently being handled.")
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions["metrics"] = self
+
+    # ---------------- RECORDING ----------------
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) > 64:
+                    self._retire_dead()
+            self._local.shard = shard
+        return shard
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        self._shard().values[(name, _labels(labels))] += value
+
+    def observe(self, name, value, **labels):
+        histograms = self._shard().histograms
+        key = (name, _labels(labels))
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def collector(self, func):
+        """Register `func() -> [(name, kind, help, [(labels dict, value)])]`."""
+        self._collectors.append(func)
+        return func
+
+    # ---------------- REQUEST HOOKS ----------------
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        self.inc("http_requests_in_flight")
+
+    def _after_request(self, response):
+        endpoint = request.endpoint or "<unmatched>"
+        self.inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        self.observe("http_request_duration_seconds", time.perf_counter() - g.metrics_started, endpoint=endpoint)
+        return response
+
+    def _teardown_request(self, exc):
+        if "metrics_started" in g:
+            self.inc("http_requests_in_flight", -1)
+
+    # ---------------- EXPORT ----------------
+    def _retire_dead(self):
+        # Called with the lock held. A dead thread never writes again, so its
+        # shard can be merged without racing it.
+        alive = []
+        for shard in self._shards:
+            if shard.owner.is_alive():
+                alive.append(shard)
+                continue
+            for key, value in shard.values.items():
+                self._retired.values[key] += value
+            for key, counts in shard.histograms.items():
+                total = self._retired.histograms.setdefault(key, [0] * (len(counts) - 1) + [0.0])
+                for i, count in enumerate(counts):
+                    total[i] += count
+        self._shards = alive
+
+    def _merged(self):
+        values = defaultdict(float)
+        histograms = {}
+        with self._lock:
+            self._retire_dead()
+            shards = [self._retired] + list(self._shards)
+        for shard in shards:
+            for key, value in list(shard.values.items()):
+                values[key] += value
+            for key, counts in list(shard.histograms.items()):
+                counts = list(counts)
+                total = histograms.setdefault(key, [0] * (len(counts) - 1) + [0.0])
+                for i, count in enumerate(counts):
+                    total[i] += count
+        return values, histograms
+
+    def render(self):
+        values, histograms = self._merged()
+        by_name = defaultdict(list)
+        for (name, labels), value in values.items():
+            by_name[name].append(("value", labels, value))
+        for (name, labels), counts in histograms.items():
+            by_name[name].append(("histogram", labels, counts))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = self._meta.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_kind, labels, data in sorted(by_name[name], key=lambda sample: sample[1]):
+                if sample_kind == "value":
+                    value = int(data) if float(data).is_integer() else data
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), data[:-1]):
+                    cumulative += count
+                    le = _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(data[-1]))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
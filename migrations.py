@@ -0,0 +1,309 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with `@migration(version, name)`
+and runs once; the versions applied so far are recorded in the
+`schema_version` table. A brand-new database is created straight from the
+models and stamped with the latest version, so the steps below only ever
+run against databases created by earlier versions of the app.
+
+    flask --app app db-upgrade     # apply pending migrations
+    flask --app app db-version     # show current and latest version
+
+Migrations must not assume the models still look the way they did when
+the migration was written: check the live schema and only change what is
+missing.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, func, inspect
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable, DropConstraint, ForeignKeyConstraint
+
+from database import db, migrate_legacy_products, backfill_orders
+import analytics
+import search
+
+MIGRATIONS = []
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, server_default=func.current_timestamp()),
+)
+
+
+def migration(version, name):
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return decorator
+
+
+def head():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# ---------------- VERSION TRACKING ----------------
+def current_version():
+    """The applied version, 0 for a pre-migrations database, None for an empty one."""
+    inspector = inspect(db.engine)
+    if inspector.has_table("schema_version"):
+        return db.session.execute(db.select(func.max(schema_version.c.version))).scalar() or 0
+    if inspector.has_table("users"):
+        return 0
+    return None
+
+
+def _stamp(version, name):
+    db.session.execute(schema_version.insert().values(version=version, name=name))
+    db.session.commit()
+
+
+def pending():
+    version = current_version()
+    if version is None:
+        return [(head(), "create schema from models")]
+    return [(v, name) for v, name, _ in MIGRATIONS if v > version]
+
+
+def upgrade(log=None):
+    """Apply every pending migration. Returns the (version, name) pairs applied."""
+    log = log or (lambda message: None)
+    version = current_version()
+    if version == head():
+        return []
+
+    version_metadata.create_all(db.engine)
+    if version is None:
+        db.create_all()
+        for v, name, _ in MIGRATIONS:
+            _stamp(v, name)
+        log(f"Created schema at version {head()}.")
+        return [(head(), "create schema from models")]
+
+    applied = []
+    for v, name, step in MIGRATIONS:
+        if v <= version:
+            continue
+        log(f"Applying {v:04d} {name}")
+        step()
+        db.session.commit()
+        _stamp(v, name)
+        applied.append((v, name))
+    return applied
+
+
+# ---------------- HELPERS ----------------
+def _columns(table):
+    return {column["name"] for column in inspect(db.engine).get_columns(table)}
+
+
+def _create_indexes(table):
+    # Indexes on columns that a later migration adds are created by that migration
+    columns = _columns(table.name)
+    for index in table.indexes:
+        if all(column.name in columns for column in index.columns):
+            index.create(db.engine, checkfirst=True)
+
+
+def _detached_index(table, name, *columns, unique=False):
+    """An index the models no longer declare, built on a throwaway copy of
+    `table` so it can be created or dropped with portable DDL."""
+    model = db.metadata.tables[table]
+    copy = Table(table, MetaData(), *(Column(column, model.c[column].type) for column in columns))
+    return Index(name, *copy.c, unique=unique)
+
+
+def _live_foreign_keys(table):
+    """The model's FKs of `table` whose columns already exist in the database."""
+    columns = _columns(table.name)
+    return [fk for fk in table.foreign_key_constraints if all(column.name in columns for column in fk.columns)]
+
+
+def _foreign_keys_match(table):
+    """True when every FK of `table` already has the model's ON DELETE rule."""
+    live = {
+        tuple(fk["constrained_columns"]): (fk.get("options") or {}).get("ondelete")
+        for fk in inspect(db.engine).get_foreign_keys(table.name)
+    }
+    for fk in _live_foreign_keys(table):
+        columns = tuple(column.name for column in fk.columns)
+        wanted = fk.ondelete.upper() if fk.ondelete else None
+        have = live.get(columns)
+        if (have.upper() if have else None) != wanted:
+            return False
+    return True
+
+
+def _rebuild_sqlite_table(table):
+    """Recreate `table` from its model definition, keeping its rows.
+
+    SQLite cannot change a foreign key in place, so this follows the
+    procedure from its ALTER TABLE documentation: create the new table,
+    copy the rows, drop the old one and rename, with FK enforcement off
+    and everything in one transaction.
+    """
+    metadata = MetaData()
+    for other in db.metadata.sorted_tables:
+        other.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"_new_{table.name}")
+    dialect = db.engine.dialect
+    columns = ", ".join(c.name for c in table.columns if c.name in _columns(table.name))
+
+    raw = db.engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+    try:
+        connection.execute("PRAGMA foreign_keys=OFF")
+        connection.execute("BEGIN")
+        try:
+            connection.execute(str(CreateTable(new_table).compile(dialect=dialect)))
+            connection.execute(f"INSERT INTO {new_table.name} ({columns}) SELECT {columns} FROM {table.name}")
+            connection.execute(f"DROP TABLE {table.name}")
+            connection.execute(f"ALTER TABLE {new_table.name} RENAME TO {table.name}")
+            for index in table.indexes:
+                connection.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+            violations = connection.execute(f"PRAGMA foreign_key_check({table.name})").fetchall()
+            if violations:
+                raise RuntimeError(f"{len(violations)} rows of {table.name} violate its foreign keys")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.isolation_level = isolation_level
+        raw.close()
+
+
+def _replace_foreign_keys(table):
+    """Swap the live FKs of `table` for the model's (server databases)."""
+    live = inspect(db.engine).get_foreign_keys(table.name)
+    with db.engine.begin() as connection:
+        for fk in live:
+            if fk.get("name"):
+                connection.execute(DropConstraint(ForeignKeyConstraint(
+                    fk["constrained_columns"],
+                    [f"{fk['referred_table']}.{column}" for column in fk["referred_columns"]],
+                    name=fk["name"], table=table,
+                )))
+        for fk in _live_foreign_keys(table):
+            connection.execute(AddConstraint(fk))
+
+
+# ---------------- MIGRATIONS ----------------
+@migration(1, "create tables added since the original schema")
+def create_missing_tables():
+    db.create_all()
+
+
+@migration(2, "denormalized cart counters and unique cart lines")
+def cart_counters():
+    if "item_count" in _columns("cart"):
+        return
+    db.session.execute(db.text("ALTER TABLE cart ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0"))
+    db.session.execute(db.text("ALTER TABLE cart ADD COLUMN total FLOAT NOT NULL DEFAULT 0"))
+
+    # Merge duplicate (cart, product) rows so the unique index can be built
+    db.session.execute(db.text(
+        "UPDATE cart_item SET quantity = ("
+        " SELECT SUM(dup.quantity) FROM cart_item dup"
+        " WHERE dup.cart_id = cart_item.cart_id AND dup.product_name = cart_item.product_name)"
+    ))
+    db.session.execute(db.text(
+        "DELETE FROM cart_item WHERE id NOT IN ("
+        " SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_name)"
+    ))
+    _detached_index("cart_item", "uq_cart_item_cart_product", "cart_id", "product_name", unique=True) \
+        .create(db.session.connection(), checkfirst=True)
+    db.session.execute(db.text(
+        "UPDATE cart SET"
+        " item_count = (SELECT COUNT(*) FROM cart_item WHERE cart_item.cart_id = cart.id),"
+        " total = (SELECT COALESCE(SUM(price * quantity), 0) FROM cart_item WHERE cart_item.cart_id = cart.id)"
+    ))
+
+
+@migration(3, "cart version and updated_at for HTTP validators")
+def cart_versions():
+    if "version" in _columns("cart"):
+        return
+    db.session.execute(db.text("ALTER TABLE cart ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+    db.session.execute(db.text("ALTER TABLE cart ADD COLUMN updated_at DATETIME"))
+    db.session.execute(db.text("UPDATE cart SET updated_at = CURRENT_TIMESTAMP"))
+
+
+@migration(4, "move per-category product tables into product")
+def legacy_products():
+    migrate_legacy_products()
+
+
+@migration(5, "copy legacy customer purchases into orders")
+def legacy_orders():
+    if backfill_orders():
+        analytics.rebuild_rollups()
+
+
+@migration(6, "indexes for every lookup the routes make")
+def lookup_indexes():
+    # Users.email is covered by its unique index; this adds customers.email
+    # and any model index an older database is still missing
+    # (cart_item (cart_id, product_name), orders.created_at, ...)
+    for table in db.metadata.sorted_tables:
+        _create_indexes(table)
+
+
+@migration(7, "ON DELETE rules for cart, order and payment foreign keys")
+def delete_cascades():
+    # Rows already pointing at deleted parents would block enforcement
+    db.session.execute(db.text("DELETE FROM cart WHERE user_id NOT IN (SELECT id FROM users)"))
+    db.session.execute(db.text("DELETE FROM cart_item WHERE cart_id NOT IN (SELECT id FROM cart)"))
+    db.session.execute(db.text("DELETE FROM order_line WHERE order_id NOT IN (SELECT id FROM orders)"))
+    for table, column in (("orders", "user_id"), ("payment", "user_id")):
+        db.session.execute(db.text(
+            f"UPDATE {table} SET {column} = NULL WHERE {column} NOT IN (SELECT id FROM users)"
+        ))
+    db.session.execute(db.text("UPDATE payment SET order_id = NULL WHERE order_id NOT IN (SELECT id FROM orders)"))
+    db.session.commit()
+
+    for name in ("cart", "cart_item", "orders", "order_line", "payment"):
+        table = db.metadata.tables[name]
+        if _foreign_keys_match(table):
+            continue
+        if db.engine.dialect.name == "sqlite":
+            _rebuild_sqlite_table(table)
+        else:
+            _replace_foreign_keys(table)
+
+
+@migration(8, "full-text index for product search")
+def product_search_index():
+    # No-op outside SQLite (or without FTS5); search falls back to LIKE there
+    search.install(db.session.connection())
+
+
+@migration(9, "product stock levels and stock reservations")
+def inventory():
+    if "stock" not in _columns("product"):
+        db.session.execute(db.text("ALTER TABLE product ADD COLUMN stock INTEGER"))
+        db.session.commit()
+    db.create_all()
+    _create_indexes(db.metadata.tables["product"])
+
+
+@migration(10, "cart items reference products by id")
+def cart_item_product_ids():
+    if "product_id" not in _columns("cart_item"):
+        db.session.execute(db.text(
+            "ALTER TABLE cart_item ADD COLUMN product_id INTEGER REFERENCES product (id) ON DELETE SET NULL"
+        ))
+    # Same name -> product rule as the price index: the oldest product wins
+    db.session.execute(db.text(
+        "UPDATE cart_item SET product_id = ("
+        " SELECT MIN(product.id) FROM product WHERE product.name = cart_item.product_name)"
+        " WHERE product_id IS NULL"
+    ))
+    _detached_index("cart_item", "uq_cart_item_cart_product", "cart_id", "product_name") \
+        .drop(db.session.connection(), checkfirst=True)
+    db.session.commit()
+    _create_indexes(db.metadata.tables["cart_item"])
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, tuple_
+
+
+# Cursors are opaque to clients: the sort-key values of the last row on a
+# page, JSON encoded and base64'd so they can travel in a query string.
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_value(column, value):
+    """`value` as the column's Python type; raises on anything a client could have tampered with."""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise TypeError(value)
+        return datetime.fromisoformat(value)
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if type(value) is not python_type:  # bool is an int, but never a valid id
+        raise TypeError(value)
+    return value
+
+
+def decode_cursor(token, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def keyset_page(query, columns, cursor=None, limit=50):
+    """Return one page of `query` ordered by `columns` (newest first).
+
+    `columns` must end with a unique column (normally the primary key) so
+    that the sort order is total. Instead of OFFSET, the next page starts
+    strictly after the last row seen, which keeps every page an index
+    range scan no matter how deep the client pages.
+
+    Returns `(rows, next_cursor)`; `next_cursor` is None on the last page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if len(columns) == 1:
+            query = query.filter(columns[0] < values[0])
+        else:
+            bound = [literal(v, c.type) for c, v in zip(columns, values)]
+            query = query.filter(tuple_(*columns) < tuple_(*bound))
+
+    rows = query.order_by(*[c.desc() for c in columns]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
@@ -0,0 +1,155 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def canonical_method(method):
+    """Spell out werkzeug's defaults so a method compares equal to stored hashes."""
+    parts = method.split(":")
+    if parts[0] == "pbkdf2":
+        digest = parts[1] if len(parts) > 1 else "sha256"
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{digest}:{iterations}"
+    if parts[0] == "scrypt":
+        n, r, p = (parts[1:] + ["32768", "8", "1"][len(parts) - 1:])[:3]
+        return f"scrypt:{n}:{r}:{p}"
+    return method
+
+
+class PasswordHasher:
+    """Password hashing off the request thread.
+
+    Hashes are computed in a small process pool so a burst of logins uses
+    at most `workers` cores and request threads only wait. At most
+    `max_pending` hashes may be queued; beyond that HashingBusy is raised
+    and the caller should answer 503 rather than pile up work.
+
+    `method` is a werkzeug method string, e.g. "pbkdf2:sha256:600000" or
+    the memory-hard "scrypt:32768:8:1". Hashes made with other parameters
+    still verify, and `needs_rehash()` tells login to upgrade them.
+    A hash that takes longer than `timeout` seconds raises HashingBusy too.
+    With workers=0 everything runs inline, which is handy in tests.
+
+    The pool uses the "spawn" start method, so every worker re-imports the
+    `__main__` module. Under gunicorn or `flask run` that is the server's
+    own script; under `python app.py` it would be the whole app, setup and
+    migrations included, which is why app.py hashes inline when run directly.
+    """
+
+    def __init__(self, method="pbkdf2:sha256", workers=2, max_pending=32, timeout=10.0):
+        self.method = canonical_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def init_app(self, app):
+        self.method = canonical_method(app.config.get("PASSWORD_HASH_METHOD", self.method))
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", self.workers)
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", self.max_pending)
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions["passwords"] = self
+
+    def _pool(self):
+        # Started on first use; "spawn" keeps forked copies of the app's
+        # threads and locks out of the workers
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many password checks in progress.")
+        try:
+            future = self._pool().submit(func, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise HashingBusy("Password check timed out.")
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split("$", 1)[0] != self.method
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+class LoginThrottle:
+    """Sliding-window limits on failed logins per client IP and per account.
+
+    Checked before any hashing is done, so a credential-stuffing run is
+    turned away cheaply. Counts live in this process only.
+    """
+
+    def __init__(self, ip_limit=20, account_limit=5, window=900, max_keys=100000):
+        self.ip_limit = ip_limit
+        self.account_limit = account_limit
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = OrderedDict()  # key -> deque of failure times
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ip_limit = app.config.get("LOGIN_IP_LIMIT", self.ip_limit)
+        self.account_limit = app.config.get("LOGIN_ACCOUNT_LIMIT", self.account_limit)
+        self.window = app.config.get("LOGIN_THROTTLE_WINDOW", self.window)
+        app.extensions["login_throttle"] = self
+
+    def _wait(self, key, limit, now):
+        times = self._failures.get(key)
+        if not times:
+            return 0
+        while times and times[0] <= now - self.window:
+            times.popleft()
+        if len(times) < limit:
+            return 0
+        return int(times[0] + self.window - now) + 1
+
+    def retry_after(self, ip, account):
+        """Seconds until this IP/account may try again, 0 if allowed now."""
+        now = time.time()
+        with self._lock:
+            return max(self._wait(("ip", ip), self.ip_limit, now),
+                       self._wait(("account", account.lower()), self.account_limit, now))
+
+    def failure(self, ip, account):
+        now = time.time()
+        with self._lock:
+            for key in (("ip", ip), ("account", account.lower())):
+                times = self._failures.setdefault(key, deque(maxlen=max(self.ip_limit, self.account_limit)))
+                times.append(now)
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def success(self, account):
+        with self._lock:
+            self._failures.pop(("account", account.lower()), None)
@@ -0,0 +1,158 @@
+import hashlib
+import hmac
+from datetime import timedelta
+
+from database import db, Users, Payment, build_order
+from paystack import PaystackError
+import analytics
+import cart_service
+import inventory
+
+# Paystack statuses after which a transaction can no longer succeed
+FAILED_STATUSES = {"failed", "reversed"}
+
+
+# ---------------- WEBHOOK SIGNATURES ----------------
+def sign(secret, body):
+    return hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+
+
+def valid_signature(secret, body, signature):
+    return bool(signature) and hmac.compare_digest(sign(secret, body), signature)
+
+
+# ---------------- PAYMENT LIFECYCLE ----------------
+def start_payment(user, cart_id, reference, reservation_ttl=900):
+    """Record a pending payment with a snapshot of the cart, and hold its stock.
+
+    The amount is the cart's SQL-maintained total, so the item list is only
+    read as plain rows for the snapshot. Returns None for an empty cart.
+    Raises inventory.OutOfStock when a tracked product is short; the caller
+    must then roll back, which also undoes any holds already taken.
+    """
+    lines, amount = cart_service.checkout_snapshot(cart_id)
+    if not lines or amount <= 0:
+        return None
+    payment = Payment(
+        reference=reference,
+        user_id=user.id,
+        email=user.email,
+        amount_kobo=int(round(amount * 100)),  # Paystack accepts amount in Kobo
+        lines=lines,
+        status="pending",
+    )
+    db.session.add(payment)
+    db.session.flush()  # reservations reference the payment row
+    inventory.reserve(reference, [(line["product_id"], line["quantity"]) for line in lines], reservation_ttl)
+    return payment
+
+
+def cancel_payment(reference):
+    """Mark a payment that never reached the gateway as failed and give its stock back. Commits."""
+    cancelled = db.session.execute(
+        db.update(Payment)
+        .where(Payment.reference == reference, Payment.status == "pending")
+        .values(status="failed", finalized_at=db.func.current_timestamp())
+    ).rowcount
+    if cancelled:
+        inventory.release(reference)
+    db.session.commit()
+    return bool(cancelled)
+
+
+def finalize_payment(reference, transaction):
+    """Apply a verified Paystack transaction to its payment exactly once.
+
+    The pending -> success/failed transition is a conditional UPDATE made
+    in the same database transaction as the order insert and cart cleanup,
+    so whichever of callback, webhook or reconciliation gets there first
+    does the work and the others see a row that is no longer pending.
+
+    Returns the payment's status afterwards, or None for unknown references.
+    """
+    payment = db.session.get(Payment, reference)
+    if payment is None:
+        return None
+    if payment.status != "pending":
+        return payment.status
+
+    status = transaction.get("status")
+    paid = status == "success" and int(transaction.get("amount") or 0) == payment.amount_kobo
+    if not paid and status != "success" and status not in FAILED_STATUSES:
+        return "pending"  # abandoned/ongoing: the buyer may still complete it
+    new_status = "success" if paid else "failed"
+
+    claimed = db.session.execute(
+        db.update(Payment)
+        .where(Payment.reference == reference, Payment.status == "pending")
+        .values(status=new_status, finalized_at=db.func.current_timestamp())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return db.session.get(Payment, reference).status
+
+    if paid:
+        user = db.session.get(Users, payment.user_id) if payment.user_id else None
+        lines = [(line["product_name"], line["price"], line["quantity"]) for line in payment.lines]
+        order = build_order(payment.email, user.phone if user else "", lines,
+                            user_id=payment.user_id, reference=reference)
+        db.session.add(order)
+        analytics.record_order(order)
+        db.session.flush()
+
+        db.session.execute(
+            db.update(Payment).where(Payment.reference == reference).values(order_id=order.id)
+        )
+        # Only the units that were paid for; anything added afterwards stays in the cart
+        cart_id = cart_service.cart_id_for(payment.user_id) if payment.user_id else None
+        if cart_id:
+            cart_service.remove_paid(cart_id, payment.lines)
+        inventory.commit(reference)
+    else:
+        inventory.release(reference)
+
+    db.session.commit()
+    return new_status
+
+
+def verify_and_finalize(paystack, reference):
+    return finalize_payment(reference, paystack.verify(reference))
+
+
+# ---------------- RECONCILIATION ----------------
+def reconcile_pending(paystack, older_than=timedelta(minutes=2), expire_after=timedelta(days=1), limit=200):
+    """Verify payments that are still pending after `older_than`.
+
+    Payments the gateway still reports as unpaid after `expire_after` are
+    marked failed so they stop being polled.
+    """
+    now = analytics.utcnow()
+    references = [
+        ref for (ref,) in db.session.query(Payment.reference)
+        .filter(Payment.status == "pending", Payment.created_at <= now - older_than)
+        .order_by(Payment.created_at)
+        .limit(limit)
+    ]
+
+    counts = {"checked": 0, "success": 0, "failed": 0, "pending": 0, "errors": 0}
+    for reference in references:
+        counts["checked"] += 1
+        try:
+            status = verify_and_finalize(paystack, reference)
+        except PaystackError:
+            counts["errors"] += 1
+            continue
+        if status == "pending":
+            expired = db.session.execute(
+                db.update(Payment)
+                .where(Payment.reference == reference, Payment.status == "pending",
+                       Payment.created_at <= now - expire_after)
+                .values(status="failed", finalized_at=db.func.current_timestamp())
+            ).rowcount
+            if expired:
+                inventory.release(reference)
+            db.session.commit()
+            status = "failed" if expired else "pending"
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
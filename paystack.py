@@ -0,0 +1,218 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PaystackError(Exception):
+    pass
+
+
+class CircuitOpenError(PaystackError):
+    pass
+
+
+class CircuitBreaker:
+    """Stop calling the gateway after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_timeout` seconds. The next call after that
+    is let through as a probe: success closes the circuit again, failure
+    re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Let exactly one probe through; everyone else keeps failing fast
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """Call counts, errors and recent latencies per gateway operation.
+
+    Every observation is also passed to the callables in `listeners`
+    (op, seconds, error), e.g. to feed an exported metric.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.listeners = []
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def observe(self, op, seconds, error=False):
+        with self._lock:
+            stats = self._ops.setdefault(op, {
+                "calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                "recent": deque(maxlen=self.window),
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["recent"].append(seconds)
+        for listener in self.listeners:
+            listener(op, seconds, error)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for op, stats in self._ops.items():
+                recent = sorted(stats["recent"])
+                result[op] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_seconds"] / stats["calls"] * 1000, 2),
+                    "max_ms": round(stats["max_seconds"] * 1000, 2),
+                    "p50_ms": round(recent[len(recent) // 2] * 1000, 2),
+                    "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2),
+                }
+            return result
+
+
+class PaystackClient:
+    """Pooled client for the Paystack transaction API.
+
+    One `requests.Session` is shared by every request so connections (and
+    their TLS sessions) are reused. Connection errors are retried with
+    exponential backoff for every call; timeouts and 5xx responses are only
+    retried for the idempotent verify call.
+    """
+
+    def __init__(self, secret_key=None, base_url="https://api.paystack.co",
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff_factor=0.3, pool_size=10, failure_threshold=5, reset_timeout=30.0):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyStats()
+        self._session = None
+
+    def init_app(self, app):
+        config = app.config
+        self.secret_key = config["PAYSTACK_SECRET_KEY"]
+        self.base_url = config.get("PAYSTACK_BASE_URL", self.base_url).rstrip("/")
+        self.connect_timeout = config.get("PAYSTACK_CONNECT_TIMEOUT", self.connect_timeout)
+        self.read_timeout = config.get("PAYSTACK_READ_TIMEOUT", self.read_timeout)
+        self.max_retries = config.get("PAYSTACK_MAX_RETRIES", self.max_retries)
+        self.backoff_factor = config.get("PAYSTACK_RETRY_BACKOFF", self.backoff_factor)
+        self.pool_size = config.get("PAYSTACK_POOL_SIZE", self.pool_size)
+        self.breaker.failure_threshold = config.get("PAYSTACK_BREAKER_THRESHOLD", self.breaker.failure_threshold)
+        self.breaker.reset_timeout = config.get("PAYSTACK_BREAKER_RESET", self.breaker.reset_timeout)
+        self._session = None
+        app.extensions["paystack"] = self
+
+    @property
+    def session(self):
+        if self._session is None:
+            retry = Retry(
+                total=self.max_retries,
+                connect=self.max_retries,
+                read=self.max_retries,
+                status=self.max_retries,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET"}),
+                backoff_factor=self.backoff_factor,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Authorization"] = f"Bearer {self.secret_key}"
+            self._session = session
+        return self._session
+
+    def _call(self, op, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Payment gateway is unavailable, try again shortly.")
+
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}",
+                timeout=(self.connect_timeout, self.read_timeout), **kwargs
+            )
+            if response.status_code >= 500:
+                raise PaystackError(f"Paystack returned HTTP {response.status_code}.")
+            payload = response.json()
+        except (requests.RequestException, ValueError, PaystackError) as e:
+            self.breaker.record_failure()
+            self.latency.observe(op, time.perf_counter() - started, error=True)
+            if isinstance(e, PaystackError):
+                raise
+            raise PaystackError(f"Paystack {op} failed: {e}") from e
+
+        self.breaker.record_success()
+        self.latency.observe(op, time.perf_counter() - started)
+        if not payload.get("status"):
+            raise PaystackError(payload.get("message") or f"Paystack {op} was rejected.")
+        return payload["data"]
+
+    # ---------------- TRANSACTIONS ----------------
+    def initialize(self, email, amount_kobo, callback_url, reference=None, metadata=None):
+        body = {"email": email, "amount": amount_kobo, "callback_url": callback_url}
+        if reference:
+            body["reference"] = reference
+        if metadata:
+            body["metadata"] = metadata
+        return self._call("initialize", "POST", "/transaction/initialize", json=body)
+
+    def verify(self, reference):
+        return self._call("verify", "GET", f"/transaction/verify/{quote(reference, safe='')}")
+
+    # Async variants run the blocking call on a worker thread, sharing the
+    # same connection pool, breaker and metrics as the sync path.
+    async def initialize_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.initialize, *args, **kwargs)
+
+    async def verify_async(self, reference):
+        return await asyncio.to_thread(self.verify, reference)
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "operations": self.latency.snapshot(),
+        }
@@ -0,0 +1,178 @@
+"""Local stand-in for the Paystack transaction API.
+
+Implements the two endpoints the shop uses plus a fake checkout page:
+
+    POST /transaction/initialize        -> authorization_url on this server
+    GET  /transaction/verify/<ref>      -> status of the transaction
+    GET  /checkout/<ref>                -> marks the transaction paid, sends a
+                                           signed charge.success webhook (when
+                                           webhook_url is set) and redirects to
+                                           its callback_url
+
+Point the app at it with PAYSTACK_BASE_URL, e.g.
+
+    python paystack_stub.py --port 8001
+    PAYSTACK_BASE_URL=http://127.0.0.1:8001 python app.py
+
+or start it in-process with `PaystackStub().start()`.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+class PaystackStub:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, secret_key=None, webhook_url=None):
+        self.host = host
+        self.port = port
+        self.latency = latency          # seconds added to every response
+        self.secret_key = secret_key    # when set, requests must carry it and webhooks are signed with it
+        self.webhook_url = webhook_url  # where charge.success events are POSTed
+        self.fail_next = 0              # number of upcoming requests answered with HTTP 500
+        self.transactions = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def set_status(self, reference, status):
+        with self._lock:
+            self.transactions[reference]["status"] = status
+
+    def send_webhook(self, reference):
+        with self._lock:
+            transaction = dict(self.transactions[reference])
+        body = json.dumps({"event": "charge.success", "data": transaction}).encode()
+        signature = hmac.new((self.secret_key or "").encode(), body, hashlib.sha512).hexdigest()
+        request = Request(self.webhook_url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "X-Paystack-Signature": signature,
+        })
+        with urlopen(request, timeout=10) as response:
+            return response.status
+
+    # ---------------- REQUEST HANDLING ----------------
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code, payload=None, headers=None):
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _prepare(self):
+                with stub._lock:
+                    stub.requests.append((self.command, self.path))
+                    failing = stub.fail_next > 0
+                    if failing:
+                        stub.fail_next -= 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failing:
+                    self._send(500, {"status": False, "message": "Stub failure"})
+                    return False
+                if stub.secret_key and not self.path.startswith("/checkout/") \
+                        and self.headers.get("Authorization") != f"Bearer {stub.secret_key}":
+                    self._send(401, {"status": False, "message": "Invalid key"})
+                    return False
+                return True
+
+            def do_POST(self):
+                if not self._prepare():
+                    return
+                if self.path != "/transaction/initialize":
+                    return self._send(404, {"status": False, "message": "Not found"})
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not body.get("email") or not body.get("amount"):
+                    return self._send(400, {"status": False, "message": "email and amount are required"})
+                reference = body.get("reference") or uuid.uuid4().hex[:12]
+                with stub._lock:
+                    stub.transactions[reference] = {
+                        "reference": reference,
+                        "email": body["email"],
+                        "amount": body["amount"],
+                        "callback_url": body.get("callback_url"),
+                        "metadata": body.get("metadata"),
+                        "status": "abandoned",
+                    }
+                self._send(200, {"status": True, "message": "Authorization URL created", "data": {
+                    "authorization_url": f"{stub.base_url}/checkout/{reference}",
+                    "access_code": uuid.uuid4().hex,
+                    "reference": reference,
+                }})
+
+            def do_GET(self):
+                if not self._prepare():
+                    return
+                if self.path.startswith("/transaction/verify/"):
+                    reference = self.path.rsplit("/", 1)[1]
+                    with stub._lock:
+                        transaction = dict(stub.transactions.get(reference) or {})
+                    if not transaction:
+                        return self._send(400, {"status": False, "message": "Transaction reference not found"})
+                    return self._send(200, {"status": True, "message": "Verification successful", "data": transaction})
+
+                if self.path.startswith("/checkout/"):
+                    reference = self.path.rsplit("/", 1)[1]
+                    with stub._lock:
+                        transaction = stub.transactions.get(reference)
+                        if transaction:
+                            transaction["status"] = "success"
+                    if not transaction:
+                        return self._send(404, {"status": False, "message": "Not found"})
+                    if stub.webhook_url:
+                        stub.send_webhook(reference)
+                    query = urlencode({"trxref": reference, "reference": reference})
+                    return self._send(302, headers={"Location": f"{transaction['callback_url']}?{query}"})
+
+                self._send(404, {"status": False, "message": "Not found"})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Paystack stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of delay per response")
+    parser.add_argument("--secret-key", help="expected secret key; also used to sign webhooks")
+    parser.add_argument("--webhook-url", help="e.g. http://127.0.0.1:5000/paystack/webhook")
+    args = parser.parse_args()
+
+    stub = PaystackStub(args.host, args.port, args.latency, args.secret_key, args.webhook_url)
+    print(f"Paystack stub listening on {stub.start()}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,149 @@
+"""Bulk loading of catalog products from CSV or JSON.
+
+Every row is validated before anything is written. Rows are then sent in
+batches of executemany INSERTs/UPDATEs, one transaction per batch. Core
+statements bypass the ORM flush hooks that invalidate the catalog cache,
+so the caller passes `on_commit` to invalidate it after each batch.
+"""
+import csv
+import io
+import json
+import math
+
+from database import db, Product, CATEGORIES
+
+FIELDS = ("category", "name", "price", "image", "stock")
+ALIASES = {"image_url": "image", "product_name": "name"}
+MAX_NAME_LENGTH = 100  # CartItem.product_name / OrderLine.product_name
+
+products = Product.__table__
+
+
+# ---------------- PARSING ----------------
+def read_records(data, fmt):
+    """Parse CSV (with a header row) or JSON (a list, or {"products": [...]}) into dicts."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(data))
+        if not reader.fieldnames:
+            raise ValueError("The CSV file is empty.")
+        return [{ALIASES.get(k.strip().lower(), k.strip().lower()): v for k, v in row.items() if k}
+                for row in reader]
+    if fmt == "json":
+        try:
+            payload = json.loads(data)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(payload, dict):
+            payload = payload.get("products")
+        if not isinstance(payload, list):
+            raise ValueError('JSON must be a list of products or {"products": [...]}.')
+        return [{ALIASES.get(k, k): v for k, v in row.items()} if isinstance(row, dict) else row
+                for row in payload]
+    raise ValueError("format must be 'csv' or 'json'.")
+
+
+def guess_format(filename=None, mimetype=None):
+    if (filename or "").lower().endswith(".json") or (mimetype or "").endswith("json"):
+        return "json"
+    return "csv"
+
+
+# ---------------- VALIDATION ----------------
+_categories = {key.lower(): key for key in CATEGORIES}
+
+
+def clean(record):
+    """Return a Product row dict for one record, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("must be an object")
+    category = _categories.get(str(record.get("category") or "").strip().lower())
+    if category is None:
+        raise ValueError(f"category must be one of {', '.join(CATEGORIES)}")
+    name = str(record.get("name") or "").strip()
+    if not name or len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f"name is required (at most {MAX_NAME_LENGTH} characters)")
+    try:
+        price = round(float(record.get("price")), 2)
+    except (TypeError, ValueError):
+        raise ValueError("price must be a number")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("price must be zero or more")
+    image = str(record.get("image") or "").strip()
+    if image and not image.startswith(("http://", "https://", "/")):
+        raise ValueError("image must be an http(s) URL or a site path")
+    stock = record.get("stock")
+    if stock is not None and str(stock).strip() != "":
+        try:
+            stock = int(str(stock).strip())
+        except ValueError:
+            raise ValueError("stock must be a whole number")
+        if stock < 0:
+            raise ValueError("stock must be zero or more")
+    else:
+        stock = None  # not tracked, or left as it is on update
+    return {"category": category, "name": name, "price": price, "image": image, "stock": stock}
+
+
+def validate(records, max_errors=100):
+    """Clean every record. Returns (rows, errors); errors are {"row", "message"} dicts."""
+    rows, errors, seen = [], [], {}
+    for number, record in enumerate(records, start=1):
+        try:
+            row = clean(record)
+            if row["name"] in seen:
+                raise ValueError(f"duplicate of row {seen[row['name']]}")
+        except ValueError as e:
+            if len(errors) < max_errors:
+                errors.append({"row": number, "message": str(e)})
+            else:
+                errors.append({"row": number, "message": "too many errors, stopped validating"})
+                break
+            continue
+        seen[row["name"]] = number
+        rows.append(row)
+    return rows, errors
+
+
+# ---------------- WRITING ----------------
+def import_products(records, upsert=False, dry_run=False, batch_size=1000, on_commit=None):
+    """Validate and load `records`; nothing is written if any row is invalid.
+
+    A product whose name is already in the catalog is updated when `upsert`
+    is set and skipped otherwise. With `dry_run` the report is computed but
+    nothing is written. `on_commit` is called after every committed batch.
+    """
+    rows, errors = validate(records)
+    report = {"rows": len(records), "inserted": 0, "updated": 0, "skipped": 0,
+              "errors": errors, "dry_run": dry_run}
+    if errors:
+        return report
+
+    existing = {}
+    for product_id, name in db.session.execute(db.select(products.c.id, products.c.name)):
+        existing.setdefault(name, []).append(product_id)
+    new = [row for row in rows if row["name"] not in existing]
+    old = [row for row in rows if row["name"] in existing]
+    report["inserted"] = len(new)
+    report["updated" if upsert else "skipped"] = len(old)
+    if dry_run:
+        return report
+
+    update = (
+        db.update(products)
+        .where(products.c.id == db.bindparam("b_id"))
+        .values(category=db.bindparam("category"), price=db.bindparam("price"), image=db.bindparam("image"),
+                stock=db.func.coalesce(db.bindparam("stock"), products.c.stock))
+    )
+    batches = [(db.insert(products), new[start:start + batch_size]) for start in range(0, len(new), batch_size)]
+    if upsert:
+        # By primary key: names are not unique, hence the list of ids
+        updates = [dict(row, b_id=product_id) for row in old for product_id in existing[row["name"]]]
+        batches += [(update, updates[start:start + batch_size]) for start in range(0, len(updates), batch_size)]
+    for statement, batch in batches:
+        db.session.execute(statement, batch)
+        db.session.commit()
+        if on_commit:
+            on_commit()
+    return report
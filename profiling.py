@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCount:
+    def __init__(self):
+        self.count = 0
+
+
+class QueryCounter:
+    """Per-request SQL profiler.
+
+    Hooks the engine's cursor events to record, for every request, how many
+    statements ran, how long they took and which identical statements were
+    repeated (the usual sign of an N+1 lazy load). Results are aggregated
+    per Flask endpoint for the admin perf page.
+
+    With QUERY_PROFILE_HEADERS on (by default, in debug mode), responses
+    carry X-Query-Count, X-DB-Time-Ms and X-Duplicate-Queries. QUERY_BUDGET maps endpoints (or
+    "*") to a maximum statement count; a request over budget is logged, or
+    raises QueryBudgetExceeded when QUERY_BUDGET_STRICT is set, which fails
+    the test that made it.
+
+    The first execution of each distinct SELECT is kept so that
+    `missing_indexes()` can EXPLAIN it later and report full table scans.
+
+    Tests can also wrap any block in `counting()`:
+
+        with query_counter.counting() as queries:
+            client.get("/categories")
+        assert queries.count <= 1
+    """
+
+    def __init__(self, duplicate_threshold=3, samples=5, max_statements=500):
+        self.duplicate_threshold = duplicate_threshold
+        self.samples = samples
+        self.max_statements = max_statements
+        self.app = None
+        self._endpoints = {}
+        self._statements = {}  # SELECT text -> (endpoint, parameters) of its first execution
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.app = app
+        self.duplicate_threshold = app.config.get("QUERY_DUPLICATE_THRESHOLD", self.duplicate_threshold)
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        app.after_request(self._after_request)
+        app.extensions["query_counter"] = self
+
+    # ---------------- ENGINE EVENTS ----------------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profile_started = time.perf_counter()
+        if has_app_context():
+            g.query_count = g.get("query_count", 0) + 1
+            g.setdefault("query_statements", Counter())[statement] += 1
+        for counter in getattr(self._local, "active", ()):
+            counter.count += 1
+        if not executemany and statement not in self._statements \
+                and len(self._statements) < self.max_statements \
+                and statement.lstrip()[:6].upper() == "SELECT":
+            endpoint = request.endpoint if has_request_context() else None
+            self._statements[statement] = (endpoint, parameters)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profile_started", None)
+        if started is not None and has_app_context():
+            g.query_seconds = g.get("query_seconds", 0.0) + time.perf_counter() - started
+
+    # ---------------- PER REQUEST ----------------
+    def query_count(self):
+        return g.get("query_count", 0) if has_app_context() else 0
+
+    def duplicates(self):
+        """Statements run at least `duplicate_threshold` times in this request."""
+        statements = g.get("query_statements") or Counter()
+        return {sql: n for sql, n in statements.items() if n >= self.duplicate_threshold}
+
+    def _budget(self, endpoint):
+        budget = self.app.config.get("QUERY_BUDGET") or {}
+        if isinstance(budget, int):
+            return budget
+        return budget.get(endpoint, budget.get("*"))
+
+    def _after_request(self, response):
+        endpoint = request.endpoint or "<unmatched>"
+        count = self.query_count()
+        db_ms = g.get("query_seconds", 0.0) * 1000
+        duplicates = self.duplicates()
+        self._record(endpoint, count, db_ms, duplicates)
+
+        headers = self.app.config.get("QUERY_PROFILE_HEADERS")
+        if headers if headers is not None else self.app.debug:
+            response.headers["X-Query-Count"] = str(count)
+            response.headers["X-DB-Time-Ms"] = f"{db_ms:.2f}"
+            response.headers["X-Duplicate-Queries"] = str(sum(duplicates.values()))
+
+        budget = self._budget(endpoint)
+        if budget is not None and count > budget:
+            message = f"{endpoint} ran {count} queries (budget {budget})"
+            if self.app.config.get("QUERY_BUDGET_STRICT"):
+                raise QueryBudgetExceeded(message)
+            self.app.logger.warning(message)
+        return response
+
+    # ---------------- AGGREGATES ----------------
+    def _record(self, endpoint, count, db_ms, duplicates):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "max_db_ms": 0.0,
+                "n_plus_one": 0, "duplicates": Counter(),
+            })
+            stats["requests"] += 1
+            stats["queries"] += count
+            stats["max_queries"] = max(stats["max_queries"], count)
+            stats["db_ms"] += db_ms
+            stats["max_db_ms"] = max(stats["max_db_ms"], db_ms)
+            if duplicates:
+                stats["n_plus_one"] += 1
+                stats["duplicates"].update(duplicates)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = {
+                    "requests": stats["requests"],
+                    "avg_queries": round(stats["queries"] / stats["requests"], 2),
+                    "max_queries": stats["max_queries"],
+                    "avg_db_ms": round(stats["db_ms"] / stats["requests"], 2),
+                    "max_db_ms": round(stats["max_db_ms"], 2),
+                    "n_plus_one": stats["n_plus_one"],
+                    "budget": self._budget(endpoint),
+                    "duplicates": [
+                        {"statement": sql, "count": n}
+                        for sql, n in stats["duplicates"].most_common(self.samples)
+                    ],
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+        self._statements.clear()
+
+    # ---------------- INDEX CHECK ----------------
+    def missing_indexes(self, engine):
+        """Observed SELECTs whose query plan reads a whole table."""
+        dialect = engine.dialect.name
+        if dialect == "sqlite":
+            # "SCAN <table>" without "USING ... INDEX"; scans of subqueries are skipped,
+            # as are virtual tables (FTS search), which cannot take an index
+            tables = set(inspect(engine).get_table_names())
+            prefix = "EXPLAIN QUERY PLAN "
+            full_scans = lambda rows: [
+                row[-1] for row in rows
+                if row[-1].startswith("SCAN ") and " USING " not in row[-1] and "VIRTUAL TABLE" not in row[-1]
+                and row[-1].split()[1] in tables
+            ]
+        elif dialect == "postgresql":
+            prefix = "EXPLAIN "
+            full_scans = lambda rows: [row[0].strip() for row in rows if "Seq Scan on" in row[0]]
+        elif dialect == "mysql":
+            prefix = "EXPLAIN "
+            full_scans = lambda rows: [
+                f"full scan of {row._mapping['table']}" for row in rows if row._mapping.get("type") == "ALL"
+            ]
+        else:
+            return []
+
+        report = []
+        with engine.connect() as connection:
+            for statement, (endpoint, parameters) in list(self._statements.items()):
+                try:
+                    rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+                except Exception:
+                    continue  # statement no longer valid (e.g. schema changed since)
+                scans = full_scans(rows)
+                if scans:
+                    report.append({"endpoint": endpoint, "statement": statement, "scans": scans})
+        return report
+
+    @contextmanager
+    def counting(self):
+        counter = QueryCount()
+        active = self._local.__dict__.setdefault("active", [])
+        active.append(counter)
+        try:
+            yield counter
+        finally:
+            active.remove(counter)
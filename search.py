@@ -0,0 +1,130 @@
+"""Product search over name and category.
+
+On SQLite the catalog is indexed by an FTS5 table, `product_search`, that
+uses `product` as its external content. Triggers on `product` keep it in
+step with every write: the admin forms, the bulk import and raw SQL alike.
+Every query term is matched as a prefix, so "chee bur" finds
+"Cheese Burger". Results are ranked by bm25, with name hits weighted
+above category hits. Only the first CANDIDATES matches are ranked: a one
+or two letter prefix can match most of the catalog, and scoring all of it
+would cost tens of milliseconds for a box the user is still typing in.
+
+Other backends, or a SQLite build without FTS5, fall back to
+case-insensitive LIKE matching.
+"""
+import re
+
+from sqlalchemy import event
+
+from database import db, Product
+
+FTS_TABLE = "product_search"
+MAX_TERMS = 8
+CANDIDATES = 500
+
+FTS_DDL = [
+    # prefix='1 2 3' adds prefix indexes so typeahead terms avoid a token scan
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, category, content='product', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    f"CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category); END",
+    f"CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); END",
+    f"CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, category ON product BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, category) VALUES (new.id, new.name, new.category); END",
+]
+
+TERM = re.compile(r"\w+")
+
+# engine url -> whether the FTS table exists there
+_fts_available = {}
+
+
+# ---------------- INDEX MAINTENANCE ----------------
+def install(connection):
+    """Create the FTS table and triggers on a SQLite connection and index existing rows.
+
+    Returns False (and leaves the database alone) on other backends or
+    when SQLite was built without FTS5.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    options = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")}
+    if "ENABLE_FTS5" not in options:
+        return False
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts_available.clear()
+    return True
+
+
+@event.listens_for(Product.__table__, "after_create")
+def _create_index(target, connection, **kw):
+    # New databases are built with create_all and never see the migration
+    install(connection)
+
+
+def fts_available(bind):
+    key = str(bind.url)
+    if key not in _fts_available:
+        _fts_available[key] = bind.dialect.name == "sqlite" and db.inspect(bind).has_table(FTS_TABLE)
+    return _fts_available[key]
+
+
+# ---------------- QUERIES ----------------
+def terms(text):
+    return [term.lower() for term in TERM.findall(text or "")][:MAX_TERMS]
+
+
+def _row(row):
+    return {"id": row.id, "name": row.name, "category": row.category, "price": row.price, "image": row.image}
+
+
+def search_products(text, limit=10, category=None):
+    """Best matches for `text` as a list of product dicts (empty for a blank query)."""
+    words = terms(text)
+    if not words:
+        return []
+    bind = db.session.get_bind(mapper=Product.__mapper__)
+    if fts_available(bind):
+        rows = _fts_search(words, limit, category)
+    else:
+        rows = _like_search(words, limit, category)
+    return [_row(row) for row in rows]
+
+
+def _fts_search(words, limit, category):
+    # Terms are \w+ only, so quoting them is enough to keep FTS syntax out
+    match = " ".join(f'"{word}"*' for word in words)
+    if category:
+        match += ' AND category : "{}"'.format(category.replace('"', '""'))
+    # The inner LIMIT stops the match scan early; only those rows get a bm25 score
+    sql = (
+        f"SELECT product.id, product.name, product.category, product.price, product.image "
+        f"FROM (SELECT rowid AS id, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match LIMIT :candidates) AS hit "
+        f"JOIN product ON product.id = hit.id "
+        f"ORDER BY hit.rank, length(product.name) LIMIT :limit"
+    )
+    params = {"match": match, "candidates": max(CANDIDATES, limit), "limit": limit}
+    return db.session.execute(db.text(sql), params).all()
+
+
+def _escape_like(word):
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _like_search(words, limit, category):
+    name = db.func.lower(Product.name)
+    query = db.select(Product.id, Product.name, Product.category, Product.price, Product.image)
+    for word in words:
+        pattern = f"%{_escape_like(word)}%"
+        query = query.where(db.or_(name.like(pattern, escape="\\"),
+                                   db.func.lower(Product.category).like(pattern, escape="\\")))
+    if category:
+        query = query.where(Product.category == category)
+    starts = db.case((name.like(f"{_escape_like(words[0])}%", escape="\\"), 0), else_=1)
+    return db.session.execute(query.order_by(starts, db.func.length(Product.name), Product.name).limit(limit)).all()
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+
+class UserCache:
+    """Short-TTL cache of user rows for Flask-Login's user_loader.
+
+    The column values of each user are kept for `ttl` seconds. A cached
+    user is rebuilt as a detached instance and merged into the request's
+    session without a SELECT, so relationships still lazy-load and changes
+    to it are flushed as usual.
+
+    A committed write to a user drops that user's entry in this process.
+    Other workers only pick the change up when their entry expires, so
+    keep USER_CACHE_TTL short.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, model):
+        self.ttl = app.config.get("USER_CACHE_TTL", self.ttl)
+        self.max_entries = app.config.get("USER_CACHE_MAX_ENTRIES", self.max_entries)
+        self.db = db
+        self.model = model
+        self.columns = [column.key for column in model.__table__.columns]
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+        app.extensions["user_cache"] = self
+
+    def get(self, user_id):
+        """The user with `user_id` attached to the current session, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                values = entry[1]
+            else:
+                values = None
+                self.misses += 1
+
+        if values is None:
+            user = self.db.session.get(self.model, user_id)
+            if user is not None and self.ttl > 0:
+                self._store(user_id, {key: getattr(user, key) for key in self.columns})
+            return user
+
+        user = self.model(**values)
+        make_transient_to_detached(user)
+        return self.db.session.merge(user, load=False)
+
+    def _store(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # ---------------- WRITE-THROUGH INVALIDATION ----------------
+    # Same scheme as the catalog cache: remember which users a flush
+    # touched and drop them once the transaction commits.
+    def _after_flush(self, session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, self.model) and obj.id is not None:
+                session.info.setdefault("users_changed", set()).add(obj.id)
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop("users_changed", ()):
+            self.invalidate(user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop("users_changed", None)